@@ -1,9 +1,16 @@
 import argparse
+import copy
+import ctypes
+import multiprocessing
+import multiprocessing.queues
+import multiprocessing.sharedctypes
 import os
-import random
+import platform
+import queue
 import shutil
+import signal
 import time
-from collections import deque
+import warnings
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -14,28 +21,281 @@ import torch.nn.functional as F
 from tqdm import tqdm
 
 from board import Text
+from checkpoint import CheckpointWriter, load_checkpoint, save_atomic
+from env import SnakeEnv
 from event import EventManager
 from game import Game
+from grid import Grid
+from metrics import Histogram, metrics
+from profiler import profiler
+from replay import Replay
 from settings import Global
+from shared import SharedWeights, TransitionRing
 from snake import Direction
 from util import Util
 
 
+_buffer_size = metrics.gauge("replay_buffer_size", "transitions in the replay buffer")
+_sample_seconds = metrics.histogram("replay_sample_seconds", help_text="latency of ReplayBuffer.sample")
+_actions = metrics.counter("dqn_actions_total", "actions taken by DQN.take_action")
+_action_seconds = metrics.histogram("dqn_take_action_seconds", help_text="latency of DQN.take_action")
+_updates = metrics.counter("dqn_updates_total", "gradient updates by DQN.update")
+_update_seconds = metrics.histogram("dqn_update_seconds", help_text="latency of DQN.update")
+_episodes = metrics.counter("episodes_total", "finished training episodes")
+_episode_length = metrics.histogram("episode_length_steps", Histogram.exponential_buckets(1, 2, 16),
+                                    "steps of each training episode")
+_episode_score = metrics.gauge("episode_score", "score of the last training episode")
+_max_score = metrics.gauge("max_score", "max score of the training")
+_transitions = metrics.counter("actor_transitions_total", "transitions received from the actor processes")
+
+
 class ReplayBuffer:
-    def __init__(self, capacity: int) -> None:
-        self.buffer: deque[tuple] = deque(maxlen=capacity)
+    """
+    Fixed-capacity ring of transitions stored in contiguous arrays, the oldest transition is overwritten when full.
+    The arrays are allocated at the first `add`, when the state size is known.
+    """
 
-    def add(self, state, action, reward, next_state, done) -> None:
-        self.buffer.append((state, action, reward, next_state, done))
+    def __init__(self, capacity: int, seed: int | None = None, pin_memory=False) -> None:
+        """
+        :param pin_memory: sample into page-locked memory, for asynchronous copies to CUDA
+        """
+        self.capacity: int = capacity
+        self.pin_memory: bool = pin_memory
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self._next: int = 0  # index of the next transition to write
+        self._size: int = 0
+
+        self.states: npt.NDArray[np.float32] = np.empty((0, 0), dtype=np.float32)
+        self.actions: npt.NDArray[np.int64] = np.empty(capacity, dtype=np.int64)
+        self.rewards: npt.NDArray[np.float32] = np.empty(capacity, dtype=np.float32)
+        self.next_states: npt.NDArray[np.float32] = np.empty((0, 0), dtype=np.float32)
+        self.dones: npt.NDArray[np.float32] = np.empty(capacity, dtype=np.float32)
+        # sampled batch, reused by every `sample` of the same batch size
+        self._batch: tuple[npt.NDArray, ...] = ()
+
+    def add(self, state: npt.NDArray, action: int, reward: float, next_state: npt.NDArray, done: bool) -> None:
+        if self.states.shape[0] != self.capacity:
+            self.states = np.empty((self.capacity, state.size), dtype=np.float32)
+            self.next_states = np.empty((self.capacity, state.size), dtype=np.float32)
+        index = self._next
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = next_state
+        self.dones[index] = done
+        self._next = (index + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        _buffer_size.set(self._size)
+
+    def add_batch(self, states: npt.NDArray, actions: npt.NDArray, rewards: npt.NDArray, next_states: npt.NDArray,
+                  dones: npt.NDArray) -> None:
+        """ add transitions in order, same as calling `add` for each of them """
+        count = min(len(actions), self.capacity)
+        if count == 0:
+            return
+        if self.states.shape[0] != self.capacity:
+            self.states = np.empty((self.capacity, states.shape[1]), dtype=np.float32)
+            self.next_states = np.empty((self.capacity, states.shape[1]), dtype=np.float32)
+        # only the last `capacity` transitions are kept, written in at most two slices split by the end of the ring
+        start = (self._next + len(actions) - count) % self.capacity
+        first = min(count, self.capacity - start)
+        for target, source in ((slice(start, start + first), slice(-count, len(actions) - count + first)),
+                               (slice(0, count - first), slice(len(actions) - count + first, None))):
+            self.states[target] = states[source]
+            self.actions[target] = actions[source]
+            self.rewards[target] = rewards[source]
+            self.next_states[target] = next_states[source]
+            self.dones[target] = dones[source]
+        self._next = (start + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+        _buffer_size.set(self._size)
+
+    def sample(self, batch_size: int) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
+        """
+        sample transitions uniformly (with replacement)
 
-    def sample(self, batch_size: int) -> tuple:
-        transitions = random.sample(self.buffer, batch_size)
-        state, action, reward, next_state, done = zip(*transitions)
-        return np.array(state), action, reward, np.array(next_state), done
+        :return: (states, actions, rewards, next_states, dones), overwritten by the next call of `sample`
+        """
+        start = time.perf_counter()
+        batch = self._gather(self.rng.integers(0, self._size, batch_size), batch_size)
+        _sample_seconds.observe(time.perf_counter() - start)
+        return batch
+
+    def _gather(self, indices: npt.NDArray[np.int64], batch_size: int) -> \
+            tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
+        """ copy the transitions at `indices` into the reused batch arrays """
+        if not self._batch or self._batch[1].shape[0] != batch_size:
+            self._batch = tuple(self._empty((batch_size,) + array.shape[1:], array.dtype) for array in (
+                self.states, self.actions, self.rewards, self.next_states, self.dones
+            ))
+        states, actions, rewards, next_states, dones = self._batch
+        np.take(self.states, indices, axis=0, out=states)
+        np.take(self.actions, indices, out=actions)
+        np.take(self.rewards, indices, out=rewards)
+        np.take(self.next_states, indices, axis=0, out=next_states)
+        np.take(self.dones, indices, out=dones)
+        return states, actions, rewards, next_states, dones
+
+    def state_dict(self) -> dict:
+        """ transitions, write position and sampling RNG, not copied """
+        size = self._size
+        return {
+            "next": self._next,
+            "size": size,
+            "states": self.states[:size],
+            "actions": self.actions[:size],
+            "rewards": self.rewards[:size],
+            "next_states": self.next_states[:size],
+            "dones": self.dones[:size],
+            "rng": self.rng.bit_generator.state,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        size = state["size"]
+        self._next = 0
+        self._size = 0
+        if size > 0:
+            self.add_batch(*(state[name].numpy() for name in ("states", "actions", "rewards", "next_states", "dones")))
+        self._next = state["next"]
+        self.rng.bit_generator.state = state["rng"]
+
+    def _empty(self, shape: tuple[int, ...], dtype: np.dtype) -> npt.NDArray:
+        array = np.empty(shape, dtype=dtype)
+        # the array keeps the pinned tensor alive
+        return torch.from_numpy(array).pin_memory().numpy() if self.pin_memory else array
+
+    def sample_tensors(self, batch_size: int, device: torch.device) -> tuple[torch.Tensor, ...]:
+        """ `sample` as tensors on `device`, sharing memory with the sampled arrays on CPU """
+        return tuple(torch.from_numpy(array).to(device) for array in self.sample(batch_size))
 
     @property
     def size(self) -> int:
-        return len(self.buffer)
+        return self._size
+
+
+class SumTree:
+    """
+    Binary tree in an array where each node is the sum of its children, leaves hold the priorities.
+    Node 1 is the root, the children of node `i` are `2i` and `2i + 1`, leaf `j` is node `offset + j`.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = capacity
+        self._depth: int = max(1, (capacity - 1).bit_length())
+        self._offset: int = 1 << self._depth
+        self.tree: npt.NDArray[np.float64] = np.zeros(2 * self._offset, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    def get(self, indices: npt.NDArray[np.int64]) -> npt.NDArray[np.float64]:
+        return self.tree[indices + self._offset]
+
+    def set(self, index: int, priority: float) -> None:
+        """ set one leaf, O(log n) """
+        tree = self.tree
+        node = index + self._offset
+        tree[node] = priority
+        while node > 1:
+            node >>= 1
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+
+    def update(self, indices: npt.NDArray[np.int64], priorities: npt.NDArray[np.float64]) -> None:
+        """ set a batch of leaves, updating each level of their ancestors at once """
+        tree = self.tree
+        nodes = indices + self._offset
+        tree[nodes] = priorities
+        for _ in range(self._depth):
+            nodes = np.unique(nodes >> 1)
+            tree[nodes] = tree[2 * nodes] + tree[2 * nodes + 1]
+
+    def find(self, values: npt.NDArray[np.float64]) -> npt.NDArray[np.int64]:
+        """ for each value in [0, total), find the leaf where the prefix sum of priorities reaches it """
+        tree = self.tree
+        values = values.copy()
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self._depth):
+            left = 2 * nodes
+            left_sum = tree[left]
+            # never go to an empty subtree, which float rounding could otherwise do
+            go_right = (values >= left_sum) & (tree[left + 1] > 0)
+            values -= left_sum * go_right
+            nodes = left + go_right
+        return nodes - self._offset
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer sampling transitions in proportion to priority ** alpha, the priority is the absolute TD error
+    of the last update of the transition, new transitions get the max priority so they are replayed at least once.
+    The bias is corrected by importance-sampling weights, with beta annealed to 1.
+    """
+
+    def __init__(self, capacity: int, seed: int | None = None, pin_memory=False, alpha: float = 0.6,
+                 beta: float = 0.4, beta_increment: float = 1e-5, epsilon: float = 1e-3) -> None:
+        """
+        :param alpha: how much prioritization is used, 0 -> uniform
+        :param beta: initial strength of the importance-sampling correction, 1 -> full correction
+        :param beta_increment: added to beta at each sample, until 1
+        :param epsilon: added to the TD errors, so no transition has zero priority
+        """
+        super().__init__(capacity, seed, pin_memory)
+        self.alpha: float = alpha
+        self.beta: float = beta
+        self.beta_increment: float = beta_increment
+        self.epsilon: float = epsilon
+        self.tree: SumTree = SumTree(capacity)
+        self._max_priority: float = 1.0
+
+    def add(self, state: npt.NDArray, action: int, reward: float, next_state: npt.NDArray, done: bool) -> None:
+        index = self._next
+        super().add(state, action, reward, next_state, done)
+        self.tree.set(index, self._max_priority ** self.alpha)
+
+    def add_batch(self, states: npt.NDArray, actions: npt.NDArray, rewards: npt.NDArray, next_states: npt.NDArray,
+                  dones: npt.NDArray) -> None:
+        count = min(len(actions), self.capacity)
+        indices = (self._next + len(actions) - count + np.arange(count)) % self.capacity
+        super().add_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(indices, np.full(len(indices), self._max_priority ** self.alpha))
+
+    def state_dict(self) -> dict:
+        state = super().state_dict()
+        state.update(tree=self.tree.tree, max_priority=self._max_priority, beta=self.beta)
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.tree.tree[:] = state["tree"].numpy()
+        self._max_priority = state["max_priority"]
+        self.beta = state["beta"]
+
+    def sample_prioritized(self, batch_size: int) -> tuple[tuple[npt.NDArray, ...], npt.NDArray, npt.NDArray]:
+        """
+        sample one transition from each of `batch_size` equal segments of the total priority
+
+        :return: (batch as returned by `sample`, importance-sampling weights, indices for `update_priorities`)
+        """
+        start = time.perf_counter()
+        total = self.tree.total
+        segment = total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        indices = np.minimum(self.tree.find(values), self._size - 1)
+
+        probabilities = np.maximum(self.tree.get(indices) / total, 1e-12)
+        weights = (self._size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        batch = self._gather(indices, batch_size)
+        _sample_seconds.observe(time.perf_counter() - start)
+        return batch, weights.astype(np.float32), indices
+
+    def update_priorities(self, indices: npt.NDArray, td_errors: npt.NDArray) -> None:
+        priorities = np.abs(td_errors) + self.epsilon
+        self._max_priority = max(self._max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
 
 
 class Qnet(torch.nn.Module):
@@ -49,20 +309,28 @@ class Qnet(torch.nn.Module):
         return self.fc2(x)
 
 
+# classes of the whole models saved by old versions, pickled as __main__.Qnet when ai.py was run as a script
+LEGACY_MODEL_GLOBALS: tuple[type | tuple[type, str], ...] = (Qnet, (Qnet, "__main__.Qnet"), torch.nn.Linear)
+
+
 class DQN:
     """ DQN algorithm """
 
     def __init__(self, state_dim: int, hidden_dim: int, action_dim: int,
                  learning_rate: float, gamma: float, epsilon: float, target_update: int, device: torch.device,
-                 mode: str, model_path: str = "") -> None:
+                 mode: str, model_path: str = "", seed: int | None = None) -> None:
         self.action_dim: int = action_dim
+        self.rng: np.random.Generator = np.random.default_rng(seed)  # exploration
         self.device: torch.device = device
+        # traced q_net for action selection, sharing the parameters of q_net
+        self._inference_net: torch.jit.ScriptModule | None = None
+        checkpoint = None
         if mode == "train":
             if model_path == "":
                 self.q_net: Qnet = Qnet(state_dim, hidden_dim, self.action_dim).to(device)  # Q网络
                 self.target_q_net: Qnet = Qnet(state_dim, hidden_dim, self.action_dim).to(device)
             else:
-                self.load(model_path, "train")
+                checkpoint = self.load(model_path, "train")
         elif mode == "eval":
             if model_path == "":
                 raise ValueError("model path must be provided in `eval` mode")
@@ -74,77 +342,235 @@ class DQN:
         self.epsilon: float = epsilon  # epsilon-贪婪策略
         self.target_update: int = target_update  # 目标网络更新频率
         self.count: int = 0  # 计数器,记录更新次数
+        # inputs on the device and TD errors, reused by every update of the same batch size
+        self._inputs: dict[str, torch.Tensor] = {}
+        self._td_errors: torch.Tensor = torch.empty(0, device=device)
+        self._td_errors_host: torch.Tensor = torch.empty(0)
+        if checkpoint is not None:
+            # resume the training
+            self.optimizer.load_state_dict(checkpoint["optimizer"])
+            self.count = checkpoint["count"]
+            self.rng.bit_generator.state = checkpoint["rng"]
+
+    def save(self, writer: CheckpointWriter | None = None, path: str = "weights/model.pt") -> None:
+        """
+        save the model and the training state, see `checkpoint`
 
-    def save(self) -> None:
-        """ save the model """
-        model_save_path = "weights/model.pt"
-
-        # only save state_dict
-        # torch.save({
-        #     "model_state_dict": self.q_net.state_dict(),
-        #     "optimizer_state_dict": self.optimizer.state_dict(),
-        # }, model_save_path)
-
-        # save the whole model
-        torch.save(self.q_net, model_save_path)
-
-    def load(self, path: str, load_mode: str) -> None:
+        :param writer: save on its thread, synchronously if None
+        """
+        if writer is None:
+            save_atomic(self.checkpoint(), path)
+        else:
+            writer.write(path, self.checkpoint())
+
+    def checkpoint(self) -> dict:
+        """ state of the networks, optimizer, update counter and exploration RNG, not copied """
+        return {
+            "dims": (self.q_net.fc1.in_features, self.q_net.fc1.out_features, self.q_net.fc2.out_features),
+            "q_net": self.q_net.state_dict(),
+            "target_q_net": self.target_q_net.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "count": self.count,
+            "rng": self.rng.bit_generator.state,
+        }
+
+    def load(self, path: str, load_mode: str) -> dict | None:
         """
         load the model
 
-        :param path: the path of the model
+        :param path: the path of a checkpoint, or of a whole model saved by old versions
         :param load_mode: `train` or `eval`
+        :return: the checkpoint to resume the training from, None for an old whole model
         """
 
         if not os.path.exists(path):
             raise FileNotFoundError(f"model file: {path} not found")
 
-        # only load state_dict
-        # checkpoint = torch.load(path)
-        # self.q_net.load_state_dict(checkpoint['model_state_dict'])
-        # self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
-
-        # load the whole model
-        self.q_net = torch.load(path, map_location=self.device, weights_only=False)
+        checkpoint = load_checkpoint(path, self.device, LEGACY_MODEL_GLOBALS)
+        self._inference_net = None
+        if isinstance(checkpoint, torch.nn.Module):
+            # whole model of old versions, the optimizer and the target network start anew
+            self.q_net = checkpoint
+            self.target_q_net = copy.deepcopy(checkpoint)
+            checkpoint = None
+        else:
+            self.q_net = Qnet(*checkpoint["dims"]).to(self.device)
+            self.q_net.load_state_dict(checkpoint["q_net"])
+            self.target_q_net = Qnet(*checkpoint["dims"]).to(self.device)
+            self.target_q_net.load_state_dict(checkpoint["target_q_net"])
+        self.action_dim = self.q_net.fc2.out_features
 
         if load_mode == "train":
             self.q_net.train()
-            self.target_q_net = torch.load(path, map_location=self.device, weights_only=False)
             self.target_q_net.train()
         elif load_mode == "eval":
             self.q_net.eval()
         else:
             raise ValueError(f"mode: {load_mode} error, must be `train` or `eval`")
+        return checkpoint
 
     def take_action(self, state: npt.NDArray) -> int:  # epsilon-贪婪策略采取动作
         """ take action according to epsilon-greedy policy using Q-network """
-        if np.random.random() < self.epsilon:
-            action = np.random.randint(self.action_dim)
+        return int(self.take_actions(state.reshape(1, -1))[0])
+
+    def take_actions(self, states: npt.NDArray) -> npt.NDArray[np.int64]:
+        """
+        take actions of a batch of states according to epsilon-greedy policy, with one forward pass of the traced
+        Q-network under inference mode
+
+        :param states: (batch, state_dim)
+        :return: (batch,) actions
+        """
+        start = time.perf_counter()
+        batch_size = len(states)
+        # one draw for the batch: u < epsilon explores, and then u / epsilon is uniform in [0, 1) to pick the action
+        u = self.rng.random(batch_size)
+        explore = u < self.epsilon
+        actions = np.empty(batch_size, dtype=np.int64)
+        actions[explore] = np.minimum(u[explore] / self.epsilon * self.action_dim, self.action_dim - 1)
+
+        greedy = ~explore
+        if greedy.any():
+            state_tensor = torch.from_numpy(np.ascontiguousarray(states[greedy], dtype=np.float32)).to(self.device)
+            net = self._get_inference_net(state_tensor)
+            with torch.inference_mode():
+                actions[greedy] = net(state_tensor).argmax(1).cpu().numpy()
+        _actions.inc(batch_size)
+        _action_seconds.observe(time.perf_counter() - start)
+        return actions
+
+    def _get_inference_net(self, example: torch.Tensor) -> torch.jit.ScriptModule:
+        """ trace q_net once, the traced module keeps using the parameters of q_net as they are trained """
+        if self._inference_net is None:
+            # tracing is deprecated in favour of torch.compile, which needs a C++ toolchain and a long warm-up
+            with torch.no_grad(), warnings.catch_warnings():
+                warnings.simplefilter("ignore", FutureWarning)
+                self._inference_net = torch.jit.trace(self.q_net, example, check_trace=False)
+        return self._inference_net
+
+    def update(self, transition_dict: dict) -> npt.NDArray[np.float32]:
+        """
+        one gradient step on a batch
+
+        :param transition_dict: batch arrays of "states", "actions", "rewards", "next_states", "dones",
+                                and optionally "weights" (importance-sampling weights of each transition)
+        :return: absolute TD errors of the batch before the step, overwritten by the next update
+        """
+        start = time.perf_counter()
+        states = self._input("states", transition_dict["states"], torch.float)
+        actions = self._input("actions", transition_dict["actions"], torch.int64)
+        rewards = self._input("rewards", transition_dict["rewards"], torch.float)
+        next_states = self._input("next_states", transition_dict["next_states"], torch.float)
+        dones = self._input("dones", transition_dict["dones"], torch.float)
+        q_values = self.q_net(states).gather(1, actions.view(-1, 1)).view(-1)
+        with torch.no_grad():
+            # TD误差目标 r + gamma * max Q'(s') * (1 - done), in place on the output of the target network
+            q_targets = self.target_q_net(next_states).amax(1)  # 下个状态的最大Q值
+            q_targets.addcmul_(q_targets, dones, value=-1).mul_(self.gamma).add_(rewards)
+            if self._td_errors.shape != q_targets.shape:
+                self._td_errors = torch.empty_like(q_targets)
+                self._td_errors_host = torch.empty(q_targets.shape, pin_memory=self.device.type == "cuda")
+            torch.sub(q_targets, q_values, out=self._td_errors).abs_()
+        if "weights" in transition_dict:
+            # importance-sampling weighted mean square error of prioritized replay
+            weights = self._input("weights", transition_dict["weights"], torch.float)
+            dqn_loss = torch.mean(weights * (q_values - q_targets) ** 2)
         else:
-            state_tensor = torch.from_numpy(state).float().unsqueeze(0).to(self.device)
-            action = self.q_net(state_tensor).argmax().item()
-        return action
-
-    def update(self, transition_dict: dict) -> None:
-        states = torch.tensor(transition_dict["states"], dtype=torch.float).to(self.device)
-        actions = torch.tensor(transition_dict["actions"]).view(-1, 1).to(self.device)
-        rewards = torch.tensor(transition_dict["rewards"], dtype=torch.float).view(-1, 1).to(self.device)
-        next_states = torch.tensor(transition_dict["next_states"], dtype=torch.float).to(self.device)
-        dones = torch.tensor(transition_dict["dones"], dtype=torch.float).view(-1, 1).to(self.device)
-        q_values = self.q_net(states).gather(1, actions)
-        max_next_q_values = self.target_q_net(next_states).max(1)[0].view(-1, 1)  # 下个状态的最大Q值
-        q_targets = rewards + self.gamma * max_next_q_values * (1 - dones)  # TD误差目标
-        dqn_loss = torch.mean(F.mse_loss(q_values, q_targets))  # 均方误差损失函数
-        self.optimizer.zero_grad()  # PyTorch中默认梯度会累积,这里需要显式将梯度置为0
+            dqn_loss = F.mse_loss(q_values, q_targets)  # 均方误差损失函数
+        # PyTorch中默认梯度会累积,这里需要显式将梯度置为0, zeroed in place to keep the gradient buffers
+        self.optimizer.zero_grad(set_to_none=False)
         dqn_loss.backward()  # 反向传播更新参数
         self.optimizer.step()
 
         if self.count % self.target_update == 0:
-            self.target_q_net.load_state_dict(self.q_net.state_dict())  # 更新目标网络
+            self.sync_target()  # 更新目标网络
         self.count += 1
+        _updates.inc()
+        _update_seconds.observe(time.perf_counter() - start)
+        # also waits for the copies of the inputs, so the pinned arrays can be refilled
+        return self._td_errors_host.copy_(self._td_errors).numpy()
+
+    def _input(self, name: str, array: npt.ArrayLike, dtype: torch.dtype) -> torch.Tensor:
+        """ a batch array as a tensor on the device, shared with the array on CPU, else copied into a reused tensor """
+        tensor = torch.as_tensor(array, dtype=dtype)
+        if self.device.type == "cpu":
+            return tensor
+        buffer = self._inputs.get(name)
+        if buffer is None or buffer.shape != tensor.shape:
+            buffer = self._inputs[name] = torch.empty(tensor.shape, dtype=dtype, device=self.device)
+        # asynchronous if the array is pinned, see ReplayBuffer.pin_memory
+        return buffer.copy_(tensor, non_blocking=True)
+
+    def sync_target(self) -> None:
+        """ copy the parameters of q_net into target_q_net in place """
+        with torch.no_grad():
+            for target, source in zip(self.target_q_net.parameters(), self.q_net.parameters()):
+                target.copy_(source)
+
+
+class ObservationBuilder:
+    """
+    State of the AI: (x, y distance from the apple to the head, hungry step count, direction) followed by the grid
+    values in a square window of `2 * level + 1` cells around the head (the head itself is 0), x as the first axis.
+    The state is written into one of two preallocated buffers in turn, so it stays valid until the second
+    following `build`, and the state and next state of a transition never share memory.
+    """
+
+    def __init__(self, level: int = 4) -> None:
+        """
+        :param level: the number of layers surrounding the snake head
+        """
+        self.level: int = level
+        size = 2 * level + 1
+        self.state_dim: int = 4 + size * size
+        self._states: tuple[npt.NDArray[np.float32], ...] = tuple(
+            np.empty(self.state_dim, dtype=np.float32) for _ in range(2)
+        )
+        # views of the window part of each state
+        self._windows: tuple[npt.NDArray[np.float32], ...] = tuple(
+            state[4:].reshape(size, size) for state in self._states
+        )
+        self._turn: int = 0
+
+    def surroundings(self, grid: Grid, x: int, y: int, out: npt.NDArray) -> None:
+        """ fill `out` of shape (2 * level + 1, 2 * level + 1) with out[i, j] = value of (x - level + i, y - level + j) """
+        level = self.level
+        left, top = x - level, y - level
+        right, bottom = x + level + 1, y + level + 1
+        padding = grid.padding
+        if -padding <= left and right <= grid.width + padding and -padding <= top and bottom <= grid.height + padding:
+            out[...] = grid.padded[top + padding:bottom + padding, left + padding:right + padding].T
+        else:
+            # the window reaches out of the padding, cells outside the grid are wall
+            out.fill(Grid.WALL)
+            x0, x1 = max(left, 0), min(right, grid.width)
+            y0, y1 = max(top, 0), min(bottom, grid.height)
+            if x0 < x1 and y0 < y1:
+                out[x0 - left:x1 - left, y0 - top:y1 - top] = grid.contents[y0:y1, x0:x1].T
+        out[level, level] = 0
+
+    def build(self, game: SnakeEnv) -> npt.NDArray[np.float32]:
+        state = self._states[self._turn]
+        window = self._windows[self._turn]
+        self._turn ^= 1
+
+        head_x, head_y = game.snake.body.get_head()
+        apple_x, apple_y = game.food_manager.get_position("apple")
+        state[0] = head_x - apple_x
+        state[1] = head_y - apple_y
+        state[2] = game.snake.hungry.hungry_step_count
+        state[3] = game.snake.direction.value
+        self.surroundings(game.grid, head_x, head_y, window)
+        return state
 
 
 class AI:
+    def __init__(self, level: int = 4) -> None:
+        """
+        :param level: the number of layers surrounding the snake head observed by the AI
+        """
+        self.observation: ObservationBuilder = ObservationBuilder(level)
+
     @staticmethod
     def moving_average(input_list: list[int | float], window_size: int) -> npt.NDArray:
         """
@@ -163,30 +589,20 @@ class AI:
         return np.concatenate((begin, middle, end))
 
     @staticmethod
-    def get_surroundings(game: Game, level: int) -> npt.NDArray:
+    def get_surroundings(game: SnakeEnv, level: int) -> npt.NDArray:
         """
         get the surroundings of the snake head
         :param game: the game object
         :param level: the number of layers surrounding the snake head
         :return: 1-dim flattened numpy array
         """
-        surroundings = np.zeros((level * 2 + 1, level * 2 + 1))
-        for i in range(level * 2 + 1):
-            for j in range(level * 2 + 1):
-                if i == j == level:
-                    surroundings[i][j] = 0
-                    continue
-                surroundings[i][j] = game.grid.get_value(game.snake.x[0] - level + i, game.snake.y[0] - level + j)
+        surroundings = np.empty((level * 2 + 1, level * 2 + 1), dtype=np.float32)
+        ObservationBuilder(level).surroundings(game.grid, *game.snake.body.get_head(), surroundings)
         return surroundings.flatten()
 
-    def get_game_state(self, game: Game) -> npt.NDArray:
-        game_state = np.array((
-            game.snake.x[0] - game.food_manager.apple.x[0],
-            game.snake.y[0] - game.food_manager.apple.y[0],
-            game.snake.hungry.hungry_step_count,
-            game.snake.direction.value
-        ))
-        return np.concatenate((game_state, self.get_surroundings(game, 4)))
+    def get_game_state(self, game: SnakeEnv) -> npt.NDArray[np.float32]:
+        """ the state of the AI, see ObservationBuilder, valid until the second following call """
+        return self.observation.build(game)
 
     @staticmethod
     def update_game_surface(game: Game, reward: int, max_score: int, time_start: float) -> None:
@@ -208,7 +624,7 @@ class AI:
                  position=(0.7, 1), alpha=255)
         )
         game.update_board()
-        Util.update_screen()
+        Util.update_screen(dirty_only=True)
         game.clock.tick()
 
     @staticmethod
@@ -255,7 +671,7 @@ class AI:
             print(f"model at max score copied to {model_save_path}")
 
     @staticmethod
-    def get_game_reward(game: Game, collide_with_food: bool, collide_with_body: bool, collide_with_wall: bool) -> int:
+    def get_game_reward(game: SnakeEnv, collide_with_food: bool, collide_with_body: bool, collide_with_wall: bool) -> int:
         # if game.move_distance < 20:
         #     reward += 1 / max(1, game.move_distance)
         #     reward += 1
@@ -267,9 +683,10 @@ class AI:
         # reward = max(- game.snake.hungry.hungry_step_count, - 50)
         # reward = - game.snake.hungry.hungry_step_count
         # reward = 1
+        apple_x, apple_y = game.food_manager.get_position("apple")
         reward = max(
-            (100 - abs(game.snake.x[0] - game.food_manager.apple.x[0]) -
-             abs(game.snake.y[0] - game.food_manager.apple.y[0]) - game.snake.hungry.hungry_step_count),
+            (100 - abs(game.snake.x[0] - apple_x) -
+             abs(game.snake.y[0] - apple_y) - game.snake.hungry.hungry_step_count),
             # -50
             0
         )
@@ -285,11 +702,20 @@ class AI:
 
         return reward
 
-    def train_model(self, path: str = "") -> None:
+    def train_model(self, path: str = "", headless=False, seed: int | None = None, prioritized=False,
+                    num_actors: int = 0, train_every: int = 1, gradient_steps: int = 1) -> None:
         """
         train the model
 
         :param path: pre-trained model path
+        :param headless: train without window, the game is not rendered
+        :param seed: seed of the games, exploration, replay sampling and network initialization,
+                     the run is not reproducible if None
+        :param prioritized: use prioritized experience replay instead of uniform sampling
+        :param num_actors: collect the experience with this many actor processes, see `train_with_actors`,
+                           the games are headless and the run is not reproducible
+        :param train_every: update the agent once every this many env steps
+        :param gradient_steps: gradient steps of each update of the agent
         """
 
         lr = 2e-3
@@ -302,57 +728,93 @@ class AI:
         batch_size = 64
         device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
 
+        if seed is not None:
+            torch.manual_seed(seed)
+
         # init game
-        game = Game()
+        game = SnakeEnv(seed=seed) if headless or num_actors > 0 else Game(seed=seed)
 
-        # random.seed(0)
-        # np.random.seed(0)
-        # torch.manual_seed(0)
-        replay_buffer = ReplayBuffer(buffer_size)
+        pin_memory = device.type == "cuda"
+        replay_buffer = PrioritizedReplayBuffer(buffer_size, seed, pin_memory) if prioritized \
+            else ReplayBuffer(buffer_size, seed, pin_memory)
         state_dim = self.get_game_state(game).size
         hidden_dim = 64
         action_dim = 4
-        agent = DQN(state_dim, hidden_dim, action_dim, lr, gamma, epsilon, target_update, device, "train", path)
-
-        max_score = 0
-        return_list: list[int | float] = []
+        agent = DQN(state_dim, hidden_dim, action_dim, lr, gamma, epsilon, target_update, device, "train", path, seed)
+        writer = CheckpointWriter("weights")
+        progress = self.resume(path, game, replay_buffer) if path else {}
+
+        if num_actors > 0:
+            max_score, return_list = self.train_with_actors(
+                agent, replay_buffer, writer, progress, num_actors, seed, minimal_size, batch_size, train_every,
+                gradient_steps
+            )
+            self.finish_training(agent, writer, max_score, return_list)
+            return
+
+        max_score = progress.get("max_score", 0)
+        return_list: list[int | float] = progress.get("return_list", [])
         time_start = time.time()
-        it = 0
-        while True:
+        step_count = progress.get("step_count", 0)
+        it = progress.get("it", 0)
+        game_rng = game.rng.getstate()  # state to reset the game of the next episode with
+        stop_requested = False
+
+        def request_stop(signum, frame) -> None:
+            # checkpoints are only exact at episode boundaries, the first Ctrl-C lets the episode finish
+            nonlocal stop_requested
+            if stop_requested:
+                raise KeyboardInterrupt
+            stop_requested = True
+            print("\nStopping after this episode, press Ctrl-C again to stop now.")
+
+        sigint_handler = signal.signal(signal.SIGINT, request_stop)
+        while not stop_requested:
             it += 1
             try:
                 with tqdm(total=num_episodes, desc=f"Iteration {it}") as pbar:
                     for i_episode in range(num_episodes):
                         state = self.get_game_state(game)
                         alive = True
-                        game.init_game_surface()
+                        if isinstance(game, Game):
+                            game.init_game_surface()
                         while alive:
-                            action = agent.take_action(state)
-                            direction = self.get_direction_from_action(action)
-                            alive, _, collide_with_food, collide_with_body, collide_with_wall = \
-                                game.play(direction=direction, full_speed=True, teleport=Global.TELEPORT)
-                            reward = self.get_game_reward(game, collide_with_food, collide_with_body, collide_with_wall)
-                            next_state = self.get_game_state(game)
-                            replay_buffer.add(state, action, reward, next_state, not alive)
+                            profiler.next_frame()
+                            with profiler.phase("take_action"):
+                                action = agent.take_action(state)
+                                direction = self.get_direction_from_action(action)
+                            with profiler.phase("step"):
+                                alive, _, collide_with_food, collide_with_body, collide_with_wall = \
+                                    game.step(direction, teleport=Global.TELEPORT)
+                                reward = self.get_game_reward(
+                                    game, collide_with_food, collide_with_body, collide_with_wall
+                                )
+                                next_state = self.get_game_state(game)
+                                replay_buffer.add(state, action, reward, next_state, not alive)
                             state = next_state
-                            if replay_buffer.size > minimal_size:
+                            step_count += 1
+                            if replay_buffer.size > minimal_size and step_count % train_every == 0:
                                 # 当buffer数据的数量超过一定值后,才进行Q网络训练
-                                b_s, b_a, b_r, b_ns, b_d = replay_buffer.sample(batch_size)
-                                transition_dict = {
-                                    "states": b_s,
-                                    "actions": b_a,
-                                    "next_states": b_ns,
-                                    "rewards": b_r,
-                                    "dones": b_d
-                                }
-                                agent.update(transition_dict)
-                            self.update_game_surface(game, reward, max_score, time_start)
+                                with profiler.phase("update"):
+                                    for _ in range(gradient_steps):
+                                        self.update_agent(agent, replay_buffer, batch_size)
+                            if isinstance(game, Game):
+                                with profiler.phase("render"):
+                                    if Global.PROFILE_OVERLAY:
+                                        profiler.draw_overlay(game.surface)
+                                    self.update_game_surface(game, reward, max_score, time_start)
+                            metrics.maybe_flush()
 
                         result = game.get_score()
                         if result > max_score:
-                            agent.save()
+                            agent.save(writer)
                             max_score = result
-                        game.reset_game()
+                        _episodes.inc()
+                        _episode_length.observe(game.move_distance)
+                        _episode_score.set(result)
+                        _max_score.set(max_score)
+                        game_rng = game.rng.getstate()
+                        game.reset()
                         return_list.append(result)
                         if (i_episode + 1) % 10 == 0:
                             pbar.set_postfix({
@@ -360,12 +822,190 @@ class AI:
                                 "return": "%.3f" % np.mean(return_list[-10:])
                             })
                         pbar.update(1)
+                        if stop_requested:
+                            break
             except KeyboardInterrupt:
+                # stopped within an episode, the last checkpoint at an episode boundary is kept
                 print("Keyboard Interrupt.")
                 break
+            # at an episode boundary, resumed with a new iteration from the next episode
+            writer.write_rotating(self.training_checkpoint(agent, replay_buffer, {
+                "it": it, "step_count": step_count, "max_score": max_score, "return_list": return_list
+            }, game_rng))
+        signal.signal(signal.SIGINT, sigint_handler)
 
+        self.finish_training(agent, writer, max_score, return_list)
+
+    @staticmethod
+    def training_checkpoint(agent: 'DQN', replay_buffer: ReplayBuffer, progress: dict,
+                            game_rng: tuple | None = None) -> dict:
+        """
+        checkpoint of `DQN.checkpoint` with the replay buffer, the progress of the training and the RNG states
+
+        :param progress: counters and scores of the training, returned by `resume`
+        :param game_rng: RNG state of the game to reset it with after resuming
+        """
+        checkpoint = agent.checkpoint()
+        checkpoint.update(replay_buffer=replay_buffer.state_dict(), progress=progress,
+                          torch_rng=torch.get_rng_state(), game_rng=game_rng)
+        return checkpoint
+
+    @staticmethod
+    def resume(path: str, game: SnakeEnv, replay_buffer: ReplayBuffer) -> dict:
+        """
+        restore the replay buffer and RNG states of a checkpoint of `training_checkpoint`, the agent restores itself
+
+        :return: the progress of the training, empty if the checkpoint only has the agent
+        """
+        checkpoint = load_checkpoint(path, legacy_globals=LEGACY_MODEL_GLOBALS)
+        if not isinstance(checkpoint, dict) or "progress" not in checkpoint:
+            return {}
+        replay_buffer.load_state_dict(checkpoint["replay_buffer"])
+        torch.set_rng_state(checkpoint["torch_rng"])
+        if checkpoint["game_rng"] is not None:
+            game.rng.setstate(checkpoint["game_rng"])
+            game.reset()
+        print(f"resumed from {path} at step {checkpoint['progress']['step_count']}")
+        return checkpoint["progress"]
+
+    @staticmethod
+    def update_agent(agent: 'DQN', replay_buffer: ReplayBuffer, batch_size: int) -> None:
+        """ one update of the agent on a batch sampled from the replay buffer """
+        if isinstance(replay_buffer, PrioritizedReplayBuffer):
+            batch, weights, indices = replay_buffer.sample_prioritized(batch_size)
+        else:
+            batch, weights, indices = replay_buffer.sample(batch_size), None, None
+        b_s, b_a, b_r, b_ns, b_d = batch
+        transition_dict = {
+            "states": b_s,
+            "actions": b_a,
+            "next_states": b_ns,
+            "rewards": b_r,
+            "dones": b_d
+        }
+        if weights is not None:
+            transition_dict["weights"] = weights
+        td_errors = agent.update(transition_dict)
+        if indices is not None:
+            replay_buffer.update_priorities(indices, td_errors)
+
+    def train_with_actors(self, agent: 'DQN', replay_buffer: ReplayBuffer, writer: CheckpointWriter, progress: dict,
+                          num_actors: int, seed: int | None, minimal_size: int, batch_size: int, train_every: int = 1,
+                          gradient_steps: int = 1, broadcast_interval: int = 100, ring_capacity: int = 4096,
+                          checkpoint_interval: int = 100) -> tuple[int, list[int | float]]:
+        """
+        learner of the parallel training: actor processes play headless games with copies of the Q-network and
+        send the transitions through shared memory, this process adds them to the replay buffer and updates the
+        agent, whose parameters are sent back to the actors every `broadcast_interval` updates
+
+        :param writer: writer of the checkpoints
+        :param progress: progress of the resumed training, see `resume`
+        :param num_actors: number of actor processes
+        :param seed: seed of the games and exploration of the actors
+        :param train_every: update the agent when this many transitions were received since the last update,
+                            when the actors are faster than the learner, it updates as often as it can
+        :param gradient_steps: gradient steps of each update of the agent
+        :param broadcast_interval: number of updates between two broadcasts of the parameters
+        :param ring_capacity: transitions buffered for each actor, an actor waits when its ring is full
+        :param checkpoint_interval: number of episodes between two checkpoints
+        :return: (max score, score of each episode)
+        """
+
+        if platform.machine().lower() not in ("x86_64", "amd64", "i386", "i686"):
+            # TransitionRing and SharedWeights rely on the store order of x86 instead of locks
+            raise ValueError(f"actor processes are only supported on x86, not on {platform.machine()}")
+        context = multiprocessing.get_context("spawn")
+        rings = [TransitionRing(ring_capacity, self.observation.state_dim) for _ in range(num_actors)]
+        weights = SharedWeights(agent.q_net)
+        weights.publish(agent.q_net)
+        results = context.Queue()
+        # without lock, an actor killed at any point can not block the learner
+        stop = multiprocessing.sharedctypes.RawValue(ctypes.c_bool, False)
+        seeds = np.random.SeedSequence(seed).generate_state(num_actors)
+        dims = (agent.q_net.fc1.in_features, agent.q_net.fc1.out_features, agent.action_dim)
+        actors = [
+            context.Process(target=run_actor, daemon=True, args=(
+                ring, weights, results, stop, dims, agent.epsilon, int(actor_seed), Replay.current_settings()
+            ))
+            for ring, actor_seed in zip(rings, seeds)
+        ]
+        # the actors inherit the ignored Ctrl-C, so it can not interrupt them while they start
+        handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            for actor in actors:
+                actor.start()
+        finally:
+            signal.signal(signal.SIGINT, handler)
+
+        max_score = progress.get("max_score", 0)
+        return_list: list[int | float] = progress.get("return_list", [])
+        updates = 0
+        received = progress.get("step_count", 0)
+        trained_at = received  # transitions received at the last update
+        try:
+            with tqdm(desc=f"Episodes ({num_actors} actors)") as pbar:
+                while any(actor.is_alive() for actor in actors):
+                    for ring in rings:
+                        with profiler.phase("receive"):
+                            batch = ring.peek()
+                            replay_buffer.add_batch(*batch)
+                            ring.release(len(batch[1]))
+                            received += len(batch[1])
+                            _transitions.inc(len(batch[1]))
+                    while True:
+                        try:
+                            score, length = results.get_nowait()
+                        except queue.Empty:
+                            break
+                        if score > max_score:
+                            agent.save(writer)
+                            max_score = score
+                        _episodes.inc()
+                        _episode_length.observe(length)
+                        _episode_score.set(score)
+                        _max_score.set(max_score)
+                        return_list.append(score)
+                        pbar.set_postfix({"return": "%.3f" % np.mean(return_list[-10:]), "max": max_score})
+                        pbar.update(1)
+                        if len(return_list) % checkpoint_interval == 0:
+                            writer.write_rotating(self.training_checkpoint(agent, replay_buffer, {
+                                "step_count": received, "max_score": max_score, "return_list": return_list
+                            }))
+
+                    if replay_buffer.size > minimal_size and received - trained_at >= train_every:
+                        trained_at = received
+                        profiler.next_frame()
+                        for _ in range(gradient_steps):
+                            with profiler.phase("update"):
+                                self.update_agent(agent, replay_buffer, batch_size)
+                            updates += 1
+                            if updates % broadcast_interval == 0:
+                                with profiler.phase("broadcast"):
+                                    weights.publish(agent.q_net)
+                    else:
+                        time.sleep(0.001)
+                    metrics.maybe_flush()
+        except KeyboardInterrupt:
+            print("Keyboard Interrupt.")
+        finally:
+            stop.value = True
+            for actor in actors:
+                actor.join(timeout=5)
+                if actor.is_alive():
+                    actor.terminate()
+            writer.write_rotating(self.training_checkpoint(agent, replay_buffer, {
+                "step_count": received, "max_score": max_score, "return_list": return_list
+            }))
+        return max_score, return_list
+
+    def finish_training(self, agent: 'DQN', writer: CheckpointWriter, max_score: int,
+                        return_list: list[int | float]) -> None:
+        """ save the final model and plot the scores """
+        writer.close()
         print(f"max score: {max_score}")
-        self.rename_model(max_score)
+        # a resumed training may not have beaten the max score of the checkpoint, then no model.pt was saved
+        if os.path.exists("weights/model.pt"):
+            self.rename_model(max_score)
         agent.save()
         self.rename_model(max_score, final=True)
         self.plot_result(return_list)
@@ -423,7 +1063,86 @@ class AI:
             result = game.get_score()
             if result > max_score:
                 max_score = result
-            game.reset_game()
+            game.reset()
+
+    def evaluate(self, path: str, num_games: int = 64, num_episodes: int = 256, seed: int | None = None) -> None:
+        """
+        play many games without window at once, the actions of all games are taken in one batch each step
+
+        :param path: trained model path
+        :param num_games: number of concurrent games
+        :param num_episodes: number of finished games to stop at
+        :param seed: seed of the games and exploration
+        """
+
+        device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+        agent = DQN(1, 1, 1, 0, 0, 0, 0, device, "eval", path, seed)
+        rng = np.random.default_rng(seed)
+        games = [SnakeEnv(seed=int(rng.integers(1 << 32))) for _ in range(num_games)]
+        states = np.empty((num_games, self.observation.state_dim), dtype=np.float32)
+        scores: list[int] = []
+        steps = 0
+        time_start = time.perf_counter()
+
+        with tqdm(total=num_episodes, desc="Evaluating") as pbar:
+            while len(scores) < num_episodes:
+                for i, game in enumerate(games):
+                    states[i] = self.observation.build(game)
+                actions = agent.take_actions(states)
+                for game, action in zip(games, actions):
+                    alive, _, _, _, _ = game.step(self.get_direction_from_action(int(action)),
+                                                  teleport=Global.TELEPORT)
+                    if not alive:
+                        scores.append(game.get_score())
+                        pbar.update(1)
+                        game.reset()
+                steps += num_games
+                metrics.maybe_flush()
+
+        elapsed = time.perf_counter() - time_start
+        print(f"games: {len(scores)}, mean score: {np.mean(scores):.2f}, max score: {max(scores)}, "
+              f"speed: {steps / elapsed:.0f} steps/s")
+
+
+def run_actor(ring: TransitionRing, weights: SharedWeights, results: multiprocessing.queues.Queue,
+              stop: ctypes.c_bool, dims: tuple[int, int, int], epsilon: float, seed: int,
+              settings: dict[str, int]) -> None:
+    """
+    actor process of `AI.train_with_actors`: play a headless game with epsilon-greedy actions of a copy of the
+    Q-network, push each transition to `ring` and the (score, length) of each episode to `results`,
+    and copy the parameters from `weights` whenever they are published
+
+    :param dims: (state_dim, hidden_dim, action_dim) of the Q-network
+    :param settings: settings of the learner, see `Replay.current_settings`
+    """
+
+    # Ctrl-C reaches the whole process group, only the learner handles it and stops the actors by `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # many actors share the cores, one thread each
+    torch.set_num_threads(1)
+    Replay(seed, settings).apply_settings()
+    ai = AI()
+    game = SnakeEnv(seed=seed)
+    # only q_net is used
+    agent = DQN(*dims, 0, 0, epsilon, 1, torch.device("cpu"), "train", seed=seed)
+    version = weights.copy_to(agent.q_net, -1)
+    state = ai.get_game_state(game)
+    while not stop.value:
+        version = weights.copy_to(agent.q_net, version)
+        action = agent.take_action(state)
+        alive, _, collide_with_food, collide_with_body, collide_with_wall = \
+            game.step(ai.get_direction_from_action(action), teleport=Global.TELEPORT)
+        reward = ai.get_game_reward(game, collide_with_food, collide_with_body, collide_with_wall)
+        next_state = ai.get_game_state(game)
+        while not ring.push(state, action, reward, next_state, not alive):
+            if stop.value:
+                return
+            time.sleep(0.001)
+        state = next_state
+        if not alive:
+            results.put((game.get_score(), game.move_distance))
+            game.reset()
+            state = ai.get_game_state(game)
 
 
 def main():
@@ -433,12 +1152,33 @@ def main():
         "--model-path", type=str,
         help="path to a pre-trained model, available for both `train` and `play` mode"
     )
+    parser.add_argument("--headless", action="store_true", help="train without window, only for `train` mode")
+    parser.add_argument("--seed", type=int, help="seed for a reproducible run, for `train` and `--eval`")
+    parser.add_argument("--prioritized", action="store_true",
+                        help="use prioritized experience replay, only for `train` mode")
+    parser.add_argument("--actors", type=int, default=0,
+                        help="collect experience with this many headless actor processes, only for `train` mode")
+    parser.add_argument("--train-every", type=int, default=1,
+                        help="update the network once every this many env steps, only for `train` mode")
+    parser.add_argument("--gradient-steps", type=int, default=1,
+                        help="gradient steps of each update of the network, only for `train` mode")
+    parser.add_argument("--eval", action="store_true",
+                        help="play many games without window in batches and report the scores, instead of `play` mode")
+    parser.add_argument("--num-games", type=int, default=64, help="number of concurrent games, only for `--eval`")
+    parser.add_argument("--metrics", action="store_true",
+                        help=f"write training metrics to {Global.METRICS_DIR}/ every {Global.METRICS_FLUSH_SEC} s")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"time the phases of each step, saved to {Global.PROFILE_TRACE_PATH} at exit")
     args = parser.parse_args()
 
-    mode: str = "train" if args.train else "play"
+    mode: str = "train" if args.train else "eval" if args.eval else "play"
+    if args.profile:
+        profiler.enabled = True
+    if args.metrics:
+        metrics.enabled = True
     model_path: str = args.model_path or ""
     if model_path == "":
-        if mode == "play":
+        if mode in {"play", "eval"}:
             model_path = "weights/20230401_123536_final_max_92.pt"
     elif not os.path.exists(model_path):
         raise ValueError(f"model path {model_path} does not exist")
@@ -460,7 +1200,11 @@ def main():
             print("No pre-trained model found, training a new model...")
         else:
             print(f"USING pre-trained model {model_path}")
-        ai.train_model(model_path)
+        ai.train_model(model_path, args.headless, args.seed, args.prioritized, args.actors, args.train_every,
+                       args.gradient_steps)
+    elif mode == "eval":
+        print(f"USING pre-trained model {model_path}")
+        ai.evaluate(model_path, args.num_games, seed=args.seed)
     elif mode == "play":
         try:
             print(f"USING pre-trained model {model_path}")
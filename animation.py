@@ -1,6 +1,8 @@
 import math
 import random
 
+import cv2
+import numpy as np
 import pygame
 
 from grid import Grid
@@ -11,16 +13,21 @@ from util import Util
 
 class LittleSnake(Snake):
     def __init__(self, x: int, y: int, length: int, move_speed: int, grid: Grid) -> None:
-        super().__init__(grid)
+        # only drawn on the menu, never registered to the grid of the game
+        super().__init__(grid, reg_grid=False)
         self._grid = grid
         self.direction = Direction.DOWN
-        self.length = length
-        self.x = [x] * self.length
-        self.y = [y - (i + 1) for i in range(self.length)]
+        self.set_body([x] * length, [y - (i + 1) for i in range(length)], reg_grid=False)
         self.move_speed = move_speed
 
 
 class AnimationManager:
+    # colors of the snake images, the blurred background does not need the images themselves
+    HEAD_COLOR: tuple[int, int, int] = (0xfd, 0xd9, 0x26)
+    BODY_COLOR: tuple[int, int, int] = (0x23, 0xd1, 0x2f)
+    BLUR_KERNEL_SIZE: int = 21  # at full resolution
+    LAYER_SCALE: int = 4  # the background is drawn and blurred at 1 / LAYER_SCALE resolution
+
     def __init__(self, grid: Grid) -> None:
         self._grid = grid
         self._little_fresh_snakes: list[Snake] = []
@@ -35,6 +42,12 @@ class AnimationManager:
         self.move_speed: int = 20
         self.move_timer = Util.timer(0.666 / self.move_speed)
 
+        # low resolution layer of the background, and its blurred result at full size
+        self._layer: pygame.Surface | None = None
+        self._blurred_layer: pygame.Surface | None = None
+        self._background: pygame.Surface | None = None
+        self._changed: bool = True
+
     def start(self) -> None:
         self.move_timer.start()
 
@@ -56,14 +69,18 @@ class AnimationManager:
             if regenerate and regenerate_times <= 1:
                 regenerate_times += 1
                 continue
+            body_count = self._grid.body_count.copy() if Global.DEBUG else None
             self._little_fresh_snakes.append(
                 LittleSnake(new_x, new_y, length, self.move_speed, self._grid)
             )
+            if body_count is not None and not np.array_equal(body_count, self._grid.body_count):
+                raise ValueError("Little snake of the menu registered body to the grid.")
             break
 
     def update(self) -> None:
         if not self.move_timer.arrived:
             return
+        self._changed = True
         if random.randint(0, 2) == 0:
             self._add_snake()
 
@@ -81,8 +98,39 @@ class AnimationManager:
                 self._little_on_screen_snakes[i].walk(teleport=False, reg_grid=False)
 
     def draw(self, surface: pygame.Surface) -> None:
-        for little_snake in self._little_fresh_snakes:
-            little_snake.draw(surface)
-        for little_snake in self._little_on_screen_snakes:
-            little_snake.draw(surface)
-        surface.blit(Util.gaussian_blur(surface, 21), (0, 0))
+        """ draw the blurred snakes over the whole surface, only re-rendered after the snakes moved """
+        size = surface.get_size()
+        if self._background is None or self._background.get_size() != size:
+            layer_size = (max(1, size[0] // self.LAYER_SCALE), max(1, size[1] // self.LAYER_SCALE))
+            self._layer = pygame.Surface(layer_size, 0, surface)
+            self._blurred_layer = pygame.Surface(layer_size, 0, surface)
+            self._background = pygame.Surface(size, 0, surface)
+            self._changed = True
+
+        if self._changed:
+            self._render_background()
+            self._changed = False
+        surface.blit(self._background, (0, 0))
+
+    def _render_background(self) -> None:
+        """ draw snakes on the low resolution layer, blur it and upscale it to the background """
+        if self._layer is None or self._blurred_layer is None or self._background is None:
+            return
+        layer = self._layer
+        layer.fill(Global.BACK_GROUND_COLOR)
+        block_size = Global.BLOCK_SIZE / self.LAYER_SCALE
+        left = Global.LEFT_PADDING / self.LAYER_SCALE
+        top = Global.TOP_PADDING / self.LAYER_SCALE
+        block = math.ceil(block_size)
+        for little_snake in self._little_fresh_snakes + self._little_on_screen_snakes:
+            color = self.HEAD_COLOR
+            for x, y in little_snake.body.coords():
+                layer.fill(color, (int(left + x * block_size), int(top + y * block_size), block, block))
+                color = self.BODY_COLOR
+
+        kernel_size = max(1, self.BLUR_KERNEL_SIZE // self.LAYER_SCALE) | 1
+        pixels = pygame.surfarray.pixels3d(layer)  # zero-copy view, locks the layer
+        blurred = cv2.GaussianBlur(pixels, (kernel_size, kernel_size), 0)
+        del pixels
+        pygame.surfarray.blit_array(self._blurred_layer, blurred)
+        pygame.transform.smoothscale(self._blurred_layer, self._background.get_size(), self._background)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the engine, grid and rendering hot paths, runs without window (SDL dummy video driver).
+
+    python3 benchmark.py [--filter TEXT] [--quick] [--save PATH] [--compare PATH] [--threshold RATIO]
+
+Each result is the median of several timed runs. Results are saved as JSON and can be compared with a saved
+baseline, the exit code is 1 if any benchmark is slower than the baseline by more than the threshold ratio.
+The threshold must be above the difference between two runs of the same tree: compare a second run of the
+baseline tree with the baseline first, on shared or virtual machines runs may differ by 2x.
+Compare runs of the same mode (`--quick` or not), `--quick` runs are noisier.
+"""
+
+import os
+
+# must be set before pygame is initialized
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import contextlib
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Iterator, NamedTuple
+
+import numpy as np
+import pygame
+
+from ai import AI
+from board import Board, Text
+from env import SnakeEnv
+from food import FoodManager
+from game import Game
+from grid import Grid
+from settings import Global
+from snake import Direction
+from util import Util
+from wall import Wall
+
+
+class Result(NamedTuple):
+    value: float
+    unit: str
+    higher_is_better: bool
+
+
+@contextlib.contextmanager
+def override_settings(**settings) -> Iterator[None]:
+    """ set attributes of Global temporarily, the screen size and initial position follow the grid size """
+    names = set(settings) | {"SCREEN_SIZE", "INIT_POS"}
+    saved = {name: getattr(Global, name) for name in names}
+    for name, value in settings.items():
+        setattr(Global, name, value)
+    Global.SCREEN_SIZE = (Global.GRID_COL * Global.BLOCK_SIZE + Global.LEFT_PADDING + Global.RIGHT_PADDING,
+                          Global.GRID_ROW * Global.BLOCK_SIZE + Global.TOP_PADDING + Global.BOTTOM_PADDING)
+    Global.INIT_POS = (min(2, Global.GRID_COL - Global.INIT_LENGTH - 1), min(5, Global.GRID_ROW - 1))
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(Global, name, value)
+
+
+REPEAT: int = 7  # timed runs of each benchmark, the median is reported
+
+
+def median_seconds_per_call(func: Callable[[], object], calls: int, repeat: int = REPEAT) -> float:
+    """ the median of `repeat` runs of `calls` calls, in seconds per call, after one warm-up call """
+    func()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        seconds.append((time.perf_counter() - start) / calls)
+    return statistics.median(seconds)
+
+
+def bench_play(scale: int, wanted: Callable[[str], bool]) -> Iterator[tuple[str, Result]]:
+    """ steps/s of `Game.play(full_speed=True)` with random turns, the game is reset when the snake dies """
+    for cols, rows, length in ((40, 25, 3), (80, 50, 3), (80, 50, 300), (160, 100, 1000)):
+        name = f"play/{cols}x{rows}/len{length}"
+        if not wanted(name):
+            continue
+        with override_settings(GRID_COL=cols, GRID_ROW=rows, HIT_WALL_DAMAGE=0, EAT_BODY_DAMAGE=0):
+            game = Game(seed=0)
+            rng = random.Random(0)
+            game.snake.increase_length(length - game.snake.length)
+
+            def step() -> None:
+                direction = Direction(rng.randrange(4)) if rng.random() < 0.1 else None
+                alive, _, _, _, _ = game.play(direction=direction, full_speed=True, teleport=True)
+                if not alive:
+                    game.reset()
+                    game.snake.increase_length(length - game.snake.length)
+
+            seconds = median_seconds_per_call(step, 400 * scale)
+        yield name, Result(1 / seconds, "steps/s", True)
+
+
+def fill_grid(grid: Grid, ratio: float, rng: random.Random) -> None:
+    """ fill cells with wall until `ratio` of the grid is not empty """
+    while grid.get_empty_count() > grid.width * grid.height * (1 - ratio):
+        cell = grid.random_empty_cell(rng)
+        if cell is None:
+            break
+        grid.set_value(cell[0], cell[1], Grid.WALL)
+
+
+def bench_spawn(scale: int, wanted: Callable[[str], bool]) -> Iterator[tuple[str, Result]]:
+    """ cost of eating and respawning food, and of generating a wall block, on an almost full grid """
+    for ratio in (0.5, 0.9, 0.99):
+        food_name, wall_name = f"spawn/food/fill{ratio}", f"spawn/wall/fill{ratio}"
+        if not wanted(food_name) and not wanted(wall_name):
+            continue
+        rng = random.Random(0)
+        grid = Grid(Global.GRID_COL, Global.GRID_ROW)
+        fill_grid(grid, ratio, rng)
+        food_manager = FoodManager(grid, None, rng)
+
+        def eat() -> None:
+            food_manager.eat(*food_manager.get_position(food_manager.kinds[0].name))
+
+        if wanted(food_name):
+            seconds = median_seconds_per_call(eat, 400 * scale)
+            yield food_name, Result(seconds * 1e6, "us", False)
+
+        wall = Wall(grid, headless=True, rng=rng)
+
+        def spawn_wall() -> None:
+            wall.random_gen(1.5 * 1000 / (Global.GRID_COL * Global.GRID_ROW))  # one block
+            grid.clear_cell(*wall.coords.pop())
+
+        if wanted(wall_name):
+            seconds = median_seconds_per_call(spawn_wall, 400 * scale)
+            yield wall_name, Result(seconds * 1e6, "us", False)
+
+
+def bench_grid(scale: int, wanted: Callable[[str], bool]) -> Iterator[tuple[str, Result]]:
+    """ latency of single grid operations """
+    rng = random.Random(0)
+    grid = Grid(80, 50)
+    fill_grid(grid, 0.3, rng)
+    cells = [(rng.randrange(grid.width), rng.randrange(grid.height)) for _ in range(1024)]
+    calls = 20 * scale
+
+    def get_value() -> None:
+        for x, y in cells:
+            grid.get_value(x, y)
+
+    def get_type() -> None:
+        for x, y in cells:
+            grid.get_type(x, y)
+
+    def body() -> None:
+        for x, y in cells:
+            grid.add_body(x, y)
+        for x, y in cells:
+            grid.remove_body(x, y)
+
+    def random_empty_cell() -> None:
+        for _ in cells:
+            grid.random_empty_cell(rng)
+
+    for name, func, ops in (("get_value", get_value, len(cells)), ("get_type", get_type, len(cells)),
+                            ("add_remove_body", body, 2 * len(cells)),
+                            ("random_empty_cell", random_empty_cell, len(cells))):
+        if wanted(f"grid/{name}"):
+            seconds = median_seconds_per_call(func, calls)
+            yield f"grid/{name}", Result(seconds / ops * 1e9, "ns", False)
+
+
+def bench_game_state(scale: int, wanted: Callable[[str], bool]) -> Iterator[tuple[str, Result]]:
+    """ cost of building the observation of the AI """
+    if not wanted("ai/get_game_state"):
+        return
+    ai = AI()
+    env = SnakeEnv(seed=0)
+    seconds = median_seconds_per_call(lambda: ai.get_game_state(env), 200 * scale)
+    yield "ai/get_game_state", Result(seconds * 1e6, "us", False)
+
+
+def bench_render(scale: int, wanted: Callable[[str], bool]) -> Iterator[tuple[str, Result]]:
+    """ frame time of drawing the status texts and of the full screen blur """
+    if not wanted("render/text_draw") and not wanted("render/gaussian_blur_21"):
+        return
+    pygame.display.init()
+    pygame.font.init()
+    surface = pygame.display.set_mode(Global.SCREEN_SIZE)
+    board = Board()
+    frame = [0]
+
+    def draw_texts() -> None:
+        # the frame counter changes every frame like the FPS text in game
+        frame[0] += 1
+        board.add(
+            Text(f"FPS: {frame[0] % 60}", pygame.Color("white"), "left_top", alpha=255),
+            Text(f"score: {frame[0] // 60}  len: 3", pygame.Color("springgreen"), "right_top", alpha=255),
+            Text("speed: 4", pygame.Color("white"), "middle_top", alpha=255),
+            Text("level: 1", pygame.Color("chartreuse"), "middle_bottom", alpha=255)
+        )
+        board.draw(surface)
+
+    if wanted("render/text_draw"):
+        seconds = median_seconds_per_call(draw_texts, 40 * scale)
+        yield "render/text_draw", Result(seconds * 1e3, "ms", False)
+
+    if wanted("render/gaussian_blur_21"):
+        surface.fill(Global.BACK_GROUND_COLOR)
+        seconds = median_seconds_per_call(lambda: Util.gaussian_blur(surface, 21), 2 * scale)
+        yield "render/gaussian_blur_21", Result(seconds * 1e3, "ms", False)
+
+
+BENCHMARKS: tuple[Callable[[int, Callable[[str], bool]], Iterator[tuple[str, Result]]], ...] = (
+    bench_play, bench_spawn, bench_grid, bench_game_state, bench_render
+)
+
+
+def run(name_filter: str = "", scale: int = 1) -> dict[str, Result]:
+    """
+    run all benchmarks
+
+    :param name_filter: only run benchmarks whose name contains it
+    :param scale: multiplier of the iteration counts
+    """
+    results: dict[str, Result] = {}
+    for benchmark in BENCHMARKS:
+        for name, result in benchmark(scale, lambda benchmark_name: name_filter in benchmark_name):
+            results[name] = result
+            print(f"{name:<32} {result.value:>14.2f} {result.unit}")
+    return results
+
+
+def save(results: dict[str, Result], path: str) -> None:
+    data = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": {name: result._asdict() for name, result in results.items()},
+    }
+    with open(path, "w") as file:
+        json.dump(data, file, indent=4)
+    print(f"results saved to {path}")
+
+
+def compare(results: dict[str, Result], path: str, threshold: float) -> bool:
+    """
+    compare results with a baseline
+
+    :param threshold: allowed ratio of slowdown, e.g. 0.1 -> 10%
+    :return: True if no benchmark regressed
+    """
+    with open(path) as file:
+        baseline = {name: Result(**result) for name, result in json.load(file)["results"].items()}
+
+    passed = True
+    print(f"\n{'benchmark':<32} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<32} {'-':>14} {result.value:>14.2f} {'new':>9}")
+            continue
+        base = baseline[name].value
+        change = (result.value - base) / base if base else 0.0
+        # positive slowdown means worse
+        slowdown = -change if result.higher_is_better else change
+        regressed = slowdown > threshold
+        passed &= not regressed
+        mark = "  REGRESSION" if regressed else ""
+        print(f"{name:<32} {base:>14.2f} {result.value:>14.2f} {change:>+9.1%}{mark}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filter", type=str, default="", help="only run benchmarks whose name contains it")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, less stable numbers")
+    parser.add_argument("--save", type=str, help="save the results to a JSON file")
+    parser.add_argument("--compare", type=str, help="compare the results with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown ratio against the baseline, must be above the difference between"
+                             " two runs of the same tree (default: 0.25)")
+    args = parser.parse_args()
+
+    results = run(args.filter, 1 if args.quick else 5)
+    if args.save:
+        save(results, args.save)
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from typing import Optional
 
 import pygame
@@ -25,21 +26,68 @@ class Text:
 
 
 class TextManager:
-    def __init__(self) -> None:
+    def __init__(self, cache_size: int = 128) -> None:
+        """
+        :param cache_size: max count of rendered text surfaces kept, the least recently used one is dropped
+        """
         pygame.font.init()
         self.text_array: list[Text] = []
 
+        # (font_name, font_size) -> font
+        self._font_cache: dict[tuple[str, int], pygame.font.Font] = {}
+        # (text, color, bg_color, alpha, font_name, font_size) -> rendered surface, in LRU order
+        self._render_cache: OrderedDict[tuple, pygame.Surface] = OrderedDict()
+        self.cache_size: int = cache_size
+        self.font_hits: int = 0
+        self.font_misses: int = 0
+        self.render_hits: int = 0
+        self.render_misses: int = 0
+
     def add(self, text: Text) -> None:
         self.text_array.append(text)
 
+    def get_font(self, font_name: str, font_size: int) -> pygame.font.Font:
+        """ get a font, the font file is only loaded at the first time """
+        key = (font_name, font_size)
+        font = self._font_cache.get(key)
+        if font is None:
+            self.font_misses += 1
+            font = self._font_cache[key] = pygame.font.Font(font_name, font_size)
+        else:
+            self.font_hits += 1
+        return font
+
+    def render(self, text: Text) -> pygame.Surface:
+        """ render a text with its alpha, unchanged texts are taken from the cache """
+        key = (text.text, tuple(text.color), None if text.bg_color is None else tuple(text.bg_color),
+               text.alpha, text.font_name, text.font_size)
+        text_surface = self._render_cache.get(key)
+        if text_surface is not None:
+            self.render_hits += 1
+            self._render_cache.move_to_end(key)
+            return text_surface
+
+        self.render_misses += 1
+        text_surface = self.get_font(text.font_name, text.font_size).render(text.text, True, text.color, text.bg_color)
+        text_surface.set_alpha(text.alpha)
+        self._render_cache[key] = text_surface
+        if len(self._render_cache) > self.cache_size:
+            self._render_cache.popitem(last=False)
+        return text_surface
+
+    def cache_info(self) -> dict[str, int]:
+        return {
+            "font_hits": self.font_hits, "font_misses": self.font_misses, "fonts": len(self._font_cache),
+            "render_hits": self.render_hits, "render_misses": self.render_misses, "renders": len(self._render_cache)
+        }
+
     def draw(self, surface: pygame.Surface) -> None:
         coordinate: tuple[int, int] = (0, 0)
         parent_surface_width = surface.get_width()
         parent_surface_height = surface.get_height()
 
         for text in self.text_array:
-            text_surface = pygame.font.Font(text.font_name, text.font_size) \
-                .render(text.text, True, text.color, text.bg_color)
+            text_surface = self.render(text)
             text_surface_width = text_surface.get_width()
             text_surface_height = text_surface.get_height()
 
@@ -105,7 +153,6 @@ class TextManager:
             else:
                 raise TypeError(f"Invalid position type: {text.position = }")
 
-            text_surface.set_alpha(text.alpha)
             if text.button is not None:
                 text.button.rect = text_surface.get_rect()
                 text.button.rect.topleft = coordinate
@@ -244,3 +291,6 @@ class Board:
 
     def clear_button(self) -> None:
         self._button_manager.clear()
+
+    def text_cache_info(self) -> dict[str, int]:
+        return self._text_manager.cache_info()
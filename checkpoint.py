@@ -0,0 +1,151 @@
+import glob
+import os
+import pickle
+import threading
+import time
+from typing import Any, Sequence
+
+import numpy as np
+import torch
+
+
+def copy_to_cpu(value: Any) -> Any:
+    """ copy of nested dicts, lists and tuples where tensors and numpy arrays are copied to CPU tensors """
+    if isinstance(value, torch.Tensor):
+        return value.detach().to("cpu", copy=True)
+    if isinstance(value, np.ndarray):
+        return torch.from_numpy(value.copy())
+    if isinstance(value, dict):
+        return {key: copy_to_cpu(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(copy_to_cpu(item) for item in value)
+    return value
+
+
+def save_atomic(checkpoint: dict, path: str) -> None:
+    """ write to a temporary file and rename it, so `path` is either the old or the new checkpoint, never partial """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        torch.save(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str, map_location: torch.device | str | None = None,
+                    legacy_globals: Sequence[type | tuple[type, str]] = ()) -> dict | torch.nn.Module:
+    """
+    load a checkpoint saved by `save_atomic`, tensors and plain values only,
+    or a whole module pickled by old versions, if it is built only from `legacy_globals`
+
+    :param legacy_globals: classes allowed in old whole modules, (class, "module.name") if pickled under another name
+    :raise pickle.UnpicklingError: if the file holds anything else
+    """
+    with torch.serialization.safe_globals(list(legacy_globals)):
+        checkpoint = torch.load(path, map_location=map_location, weights_only=True)
+    if not isinstance(checkpoint, (dict, torch.nn.Module)):
+        raise pickle.UnpicklingError(f"{path} is neither a checkpoint nor a model: {type(checkpoint).__name__}")
+    return checkpoint
+
+
+class CheckpointWriter:
+    """
+    Save checkpoints on a background thread: `write` copies the tensors and arrays of the checkpoint at once,
+    so training can go on changing them, and returns without waiting for the file.
+    A checkpoint still waiting to be written is replaced by a newer one of the same path, or by a newer rotating one.
+    Rotating checkpoints are named by time, only the last `keep` of them in the directory are kept,
+    including those of earlier runs.
+    An error of the thread is raised by the next call of `write`, `flush` or `close`.
+    """
+
+    ROTATING: str = ""  # key of the pending rotating checkpoint
+
+    def __init__(self, directory: str = "weights", keep: int = 3, name: str = "checkpoint") -> None:
+        """
+        :param name: prefix of the rotating checkpoints
+        """
+        self.directory: str = directory
+        self.keep: int = keep
+        self.name: str = name
+        # rotating checkpoints on disk, oldest first, the time in the names sorts them
+        self._rotating: list[str] = sorted(glob.glob(os.path.join(glob.escape(directory), f"{name}_*.pt")))
+        # checkpoints to write, by path, or ROTATING for the rotating one
+        self._pending: dict[str, tuple[str, dict, bool]] = {}
+        self._writing: bool = False
+        self._closed: bool = False
+        self._condition: threading.Condition = threading.Condition()
+        self._error: BaseException | None = None
+        self._thread: threading.Thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, path: str, checkpoint: dict) -> None:
+        """ save `checkpoint` to `path` """
+        self._put(path, path, checkpoint, False)
+
+    def write_rotating(self, checkpoint: dict) -> str:
+        """
+        save `checkpoint` as a new rotating checkpoint, the oldest are removed if there are more than `keep`
+
+        :return: path of the new checkpoint
+        """
+        time_str = time.strftime("%Y%m%d_%H%M%S", time.localtime())
+        path = os.path.join(self.directory, f"{self.name}_{time_str}.pt")
+        self._put(self.ROTATING, path, checkpoint, True)
+        return path
+
+    def _put(self, key: str, path: str, checkpoint: dict, rotating: bool) -> None:
+        self._raise_error()
+        item = (path, copy_to_cpu(checkpoint), rotating)
+        with self._condition:
+            # the older one is dropped, and the newer one is queued last
+            self._pending.pop(key, None)
+            self._pending[key] = item
+            self._condition.notify_all()
+
+    def flush(self) -> None:
+        """ wait until all checkpoints are written """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._pending and not self._writing)
+        self._raise_error()
+
+    def close(self) -> None:
+        """ write the pending checkpoints and stop the thread """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("failed to save a checkpoint") from error
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                path, checkpoint, rotating = self._pending.pop(next(iter(self._pending)))
+                self._writing = True
+            try:
+                save_atomic(checkpoint, path)
+                if rotating:
+                    if path in self._rotating:
+                        # written again in the same second
+                        self._rotating.remove(path)
+                    self._rotating.append(path)
+                    while len(self._rotating) > self.keep:
+                        old_path = self._rotating.pop(0)
+                        if os.path.exists(old_path):
+                            os.remove(old_path)
+            except Exception as error:
+                self._error = error
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
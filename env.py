@@ -0,0 +1,163 @@
+import random
+
+import pygame
+
+from food import FoodManager
+from grid import Grid
+from metrics import metrics
+from settings import Global
+from snake import Direction, Snake
+from util import GameState
+from wall import Wall
+
+
+_env_steps = metrics.counter("env_steps_total", "steps of all envs")
+
+
+class SnakeEnv:
+    """
+    Pure-logic snake game: grid, snake, wall, food and the game rules.
+    Runs without any window or image when no surface is given, Game extends it with display and menus.
+    """
+
+    def __init__(self, surface: pygame.Surface | None = None, seed: int | None = None) -> None:
+        """
+        :param surface: in game surface to draw on after each step, set to None to run headless
+        :param seed: seed of the random stream of walls and food, a random one if None
+        """
+        self.surface: pygame.Surface | None = surface
+        self.headless: bool = surface is None
+
+        # the same seed always gives the same game for the same inputs, see `reset`
+        self.seed: int = seed if seed is not None else random.getrandbits(32)
+        self.rng: random.Random = random.Random(self.seed)
+
+        self.grid = Grid(Global.GRID_COL, Global.GRID_ROW, Global.GRID_PADDING)
+        self.snake = Snake(self.grid, headless=self.headless)
+        self.wall = Wall(self.grid, headless=self.headless, rng=self.rng)
+        self.food_manager = FoodManager(self.grid, self.surface, rng=self.rng)
+
+        self.level: int = 1
+        self.score: int = 0
+        self.move_distance: int = 0
+        self.eat_food_count: int = 0
+
+    def reset(self, seed: int | None = None) -> None:
+        """
+        :param seed: seed of the new game, if None, drawn from the random stream of the last game
+        """
+        self.seed = seed if seed is not None else self.rng.getrandbits(32)
+        self.rng.seed(self.seed)
+        self.grid.clear_all()
+        self.snake.reset()
+        self.wall.reset()
+        self.food_manager.reset()
+        self.snake.health.reset()
+        self.snake.hungry.reset()
+        self.level = 1
+        self.score = 0
+        self.move_distance = 0
+        self.eat_food_count = 0
+
+    def step(self, direction: Direction | None = None, teleport=False) -> tuple[bool, GameState, bool, bool, bool]:
+        """
+        move snake one step and update game status
+
+        :param direction: if not None, change the direction of snake before moving
+        :param teleport: set if snake can teleport when hit the border
+        :return: (alive, game_state, collision_with_food, collision_with_body, collision_with_wall)
+        """
+
+        if direction is not None:
+            self.snake.change_direction(direction)
+
+        self.snake.walk(self.surface, teleport=teleport)
+        self.move_distance += 1
+        _env_steps.inc()
+
+        collision = self.check_collision()
+        if collision[0]:
+            # check upgrade after eating food
+            self.check_upgrade()
+
+        self.update_hungry_level()
+        status = self.check_alive()
+        return status[0], status[1], collision[0], collision[1], collision[2]
+
+    def replay_step(self, direction: Direction, teleport=False) -> tuple[bool, GameState, bool, bool, bool]:
+        """ step with a direction recorded in a replay, which is set as is since it was valid when recorded """
+        self.snake.direction = direction
+        self.snake.direction_buffer = Direction.NONE
+        return self.step(teleport=teleport)
+
+    def get_score(self) -> int:
+        return self.snake.length - self.snake.init_length + self.score
+
+    def check_collision(self) -> tuple[bool, bool, bool]:
+        return (
+            self.collide_with_food(),
+            self.collide_with_body(),
+            self.collide_with_wall()
+        )
+
+    def collide_with_food(self) -> bool:
+        food = self.food_manager.eat(*self.snake.body.get_head())
+        if food is None:
+            return False
+        self.snake.hungry.increase_satiety(food.add_satiety)
+        self.snake.health.increase(-food.toxic_level)
+        self.snake.increase_length(food.increase_length)
+        self.snake.increase_speed(food.increase_speed)
+        self.score += food.add_score
+        self.eat_food_count += 1
+        return True
+
+    def collide_with_body(self) -> bool:
+        # the head shares its cell with another segment
+        if self.grid.get_body_count(*self.snake.body.get_head()) > 1:
+            self.snake.health.increase(-Global.EAT_BODY_DAMAGE)
+            return True
+        return False
+
+    def collide_with_wall(self) -> bool:
+        if self.grid.has_wall(*self.snake.body.get_head()):
+            self.snake.health.increase(-Global.HIT_WALL_DAMAGE)
+            return True
+        return False
+
+    def update_hungry_level(self) -> None:
+        if self.snake.hungry.hungry_step_count > 0 and \
+                self.snake.hungry.hungry_step_count % max(50 - (self.level - 1) * 4, 20) == 0:
+            if self.snake.hungry.get_satiety() > 0:
+                # increase hungry value till satiety -> 0
+                self.snake.hungry.increase_satiety(-1)
+            else:
+                # start to decrease health value
+                self.snake.health.increase(-1)
+
+    def check_upgrade(self) -> None:
+        """
+        Update the level up to MAX_LEVEL and increase movement speed when level-up.
+        """
+        if self.level >= Global.MAX_LEVEL:
+            return
+        if self.get_score() // 20 > self.level - 1:
+            self.snake.increase_speed(1)
+            self.level += 1
+
+    def check_alive(self) -> tuple[bool, GameState]:
+        """
+        check if the snake is alive
+        (snake will also die if there is no space)
+        result: int: PLAYING -> snake alive; FAILED -> snake died; WINNING -> no space(win the game)
+        :return: tuple(snake_alive: bool, result: int)
+        """
+        winning = self.grid.get_empty_count() <= 0
+        failed = self.snake.health.value <= 0
+        alive = not (winning or failed)
+        result = GameState.PLAYING
+        if failed:
+            result = GameState.FAILED
+        if winning:
+            result = GameState.WINNING
+        return alive, result
@@ -19,6 +19,9 @@ class EventManager:
         if cls.match_event_type(pygame.QUIT):
             """ always check exit """
             Util.quit_game()
+        if cls.match_event_type(pygame.VIDEORESIZE) or cls.match_event_type(pygame.WINDOWEXPOSED):
+            """ the whole screen must be redrawn """
+            Util.request_full_update()
         cls.keys_pressed = pygame.key.get_pressed()
         cls.mouse_button_status = pygame.mouse.get_pressed()
         cls.mouse_pos = pygame.mouse.get_pos()
@@ -1,193 +1,164 @@
 import random
+from typing import NamedTuple
 
+import numpy as np
+import numpy.typing as npt
 import pygame
 
 from grid import Grid
 from settings import Global
+from util import Util
+
+
+class FoodKind(NamedTuple):
+    name: str
+    image_file: str
+    image_alpha: bool
+    add_satiety: int
+    toxic_level: int
+    add_score: int
+    increase_speed: int
+    increase_length: int
+    max_count: int = 0  # spawn cap, 0 -> Global.FOOD_MAX_COUNT_PER_KIND
+    spawn_weight: float = 0.25  # chance to spawn one more after each spawn, until `max_count`
+
+
+# grid value of a kind is Grid.FOOD_MIN + its index, do not reorder
+FOOD_TABLE: tuple[FoodKind, ...] = (
+    # name, image, alpha, add_satiety, toxic_level, add_score, increase_speed, increase_length
+    FoodKind("apple", "resources/img/apple_bigger.png", False, 1, 0, 0, 0, 1),
+    FoodKind("beef", "resources/img/beef_bigger.png", False, 2, 0, 0, 0, 2),
+    FoodKind("iron", "resources/img/iron_block.png", False, 1, 0, 2, 0, 1),
+    FoodKind("gold", "resources/img/gold_bigger.png", False, 2, 0, 4, 1, 1),
+    FoodKind("slimeball", "resources/img/slimeball_bigger.png", False, 1, 1, 1, -1, 1),
+    FoodKind("heart", "resources/img/heart.png", True, 1, -1, 1, 0, 1),
+)
 
 
 class FoodManager:
-    def __init__(self, grid: Grid, surface: pygame.Surface) -> None:
+    """
+    All food on the grid, stored as struct of arrays: `x[kind]`, `y[kind]` and `count[kind]` for each kind in
+    `kinds`, and `_slot` maps a cell to the index of its food in those lists.
+    """
+
+    def __init__(self, grid: Grid, surface: pygame.Surface | None, rng: random.Random | None = None) -> None:
+        """
+        :param grid: the grid to place food on
+        :param surface: in game surface, set to None to run headless (no image loaded, nothing drawn)
+        :param rng: random stream of food spawning, a new unseeded one if None
+        """
         self._grid: Grid = grid
-        self._surface: pygame.Surface = surface
-
-        self.apple = Apple()
-        if not Global.WITH_AI:
-            # full list of food
-            self.beef = Beef()
-            self.iron = Iron()
-            self.gold = Gold()
-            self.slimeball = SlimeBall()
-            self.heart = Heart()
-            self.food_list = (self.apple, self.beef, self.iron, self.gold, self.slimeball, self.heart)
-        else:
-            # only has apple, for ai-training
-            self.food_list = (self.apple,)
+        self._surface: pygame.Surface | None = surface
+        self._rng: random.Random = rng if rng is not None else random.Random()
+
+        # only has apple for ai-training
+        self.kinds: tuple[FoodKind, ...] = FOOD_TABLE[:1] if Global.WITH_AI else FOOD_TABLE
+        self.values: tuple[int, ...] = tuple(Grid.FOOD_MIN + i for i in range(len(self.kinds)))
+        self._kind_index: dict[str, int] = {kind.name: i for i, kind in enumerate(self.kinds)}
+        # grid value (without body) -> kind index, -1 if not food
+        self._kind_of_value: list[int] = [-1] * 256
+        for i, (kind, value) in enumerate(zip(self.kinds, self.values)):
+            grid.add_food_type(kind.name, value)
+            self._kind_of_value[value] = i
+
+        self.images: tuple[pygame.Surface | None, ...] = tuple(
+            None if surface is None else
+            Util.load_image(kind.image_file, (Global.BLOCK_SIZE, Global.BLOCK_SIZE), kind.image_alpha)
+            for kind in self.kinds
+        )
+        self.x: list[list[int]] = [[] for _ in self.kinds]
+        self.y: list[list[int]] = [[] for _ in self.kinds]
+        self.count: list[int] = [0] * len(self.kinds)
+        self._slot: npt.NDArray[np.int32] = np.full((grid.height, grid.width), -1, dtype=np.int32)
 
         self.update_all()
 
     def reset(self) -> None:
-        for food in self.food_list:
-            food.x.clear()
-            food.y.clear()
-            food.count = 0
-            food.update(self._grid, self._surface)
+        for i in range(len(self.kinds)):
+            self.x[i].clear()
+            self.y[i].clear()
+            self.count[i] = 0
+        self._slot.fill(-1)
+        self.update_all()
 
     def draw(self) -> None:
-        for food in self.food_list:
-            food.draw(self._surface)
+        if self._surface is None:
+            raise TypeError("Cannot draw food without surface.")
+        for i, image in enumerate(self.images):
+            if image is None:
+                raise TypeError("Food image is None.")
+            for x, y in zip(self.x[i], self.y[i]):
+                self._surface.blit(
+                    image,
+                    (x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+                     y * Global.BLOCK_SIZE + Global.TOP_PADDING)
+                )
 
     def update_all(self) -> None:
-        for food in self.food_list:
-            food.update(self._grid, self._surface)
-
-
-class FoodBase:
-    def __init__(self) -> None:
-        self.name: str = ""
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/red-f01414-10x10.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.count: int = 0
-        self.x: list[int] = []
-        self.y: list[int] = []
-        self.add_satiety: int = 0
-        self.toxic_level: int = 0
-        self.add_score: int = 0
-        self.increase_speed: int = 0
-        self.increase_length: int = 0
-
-    def draw(self, surface: pygame.Surface) -> None:
-        if self.image is None:
-            raise TypeError("Food image is None.")
-        for i in range(self.count):
-            surface.blit(
-                self.image,
-                (self.x[i] * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-                 self.y[i] * Global.BLOCK_SIZE + Global.TOP_PADDING)
-            )
-
-    def update(self, grid: Grid, surface: pygame.Surface, index=None) -> None:
-        # delete specific food after is eaten
-        if index is not None:
-            grid.clear_type(self.x[index], self.y[index], self.name)
-            del self.x[index]
-            del self.y[index]
-            self.count -= 1
-
+        for i in range(len(self.kinds)):
+            self.spawn(i)
+
+    def get_max_count(self, kind_index: int) -> int:
+        return self.kinds[kind_index].max_count or Global.FOOD_MAX_COUNT_PER_KIND
+
+    def get_position(self, name: str, index: int = 0) -> tuple[int, int]:
+        """ get the position of the `index`-th food of kind `name` """
+        kind_index = self._kind_index[name]
+        return self.x[kind_index][index], self.y[kind_index][index]
+
+    def eat(self, x: int, y: int) -> FoodKind | None:
+        """
+        remove the food on a cell and spawn new food of the same kind
+
+        :return: the kind of food eaten, None if there is no food on the cell
+        """
+        value = self._grid.get_value(x, y)
+        if Grid.value_has_body(value):
+            value -= Grid.BODY
+        kind_index = self._kind_of_value[value]
+        if kind_index < 0:
+            return None
+
+        # swap-remove the food from the lists of its kind
+        slot = self._slot.item(y, x)
+        xs, ys = self.x[kind_index], self.y[kind_index]
+        last_x, last_y = xs.pop(), ys.pop()
+        if slot < len(xs):
+            xs[slot], ys[slot] = last_x, last_y
+            self._slot[last_y, last_x] = slot
+        self._slot[y, x] = -1
+        self.count[kind_index] -= 1
+        self._grid.remove_food(x, y)
+
+        self.spawn(kind_index)
+        return self.kinds[kind_index]
+
+    def spawn(self, kind_index: int) -> None:
+        """ add one food of a kind, and then more at random until `max_count` """
+        kind = self.kinds[kind_index]
+        value = self.values[kind_index]
+        image = self.images[kind_index]
+        max_count = self.get_max_count(kind_index)
         while True:
-            if grid.get_empty_count() <= 0:
+            cell = self._grid.random_empty_cell(self._rng)
+            if cell is None:
                 break
 
-            new_x = random.randint(0, Global.GRID_COL - 1)
-            new_y = random.randint(0, Global.GRID_ROW - 1)
-
-            if not grid.is_empty(new_x, new_y):
-                continue
-
-            grid.set_type(new_x, new_y, self.name)
-            self.x.append(new_x)
-            self.y.append(new_y)
-            self.count += 1
-            surface.blit(
-                self.image,
-                (new_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-                 new_y * Global.BLOCK_SIZE + Global.TOP_PADDING)
-            )
+            new_x, new_y = cell
+            self._grid.set_food(new_x, new_y, value)
+            self._slot[new_y, new_x] = self.count[kind_index]
+            self.x[kind_index].append(new_x)
+            self.y[kind_index].append(new_y)
+            self.count[kind_index] += 1
+            if self._surface is not None and image is not None:
+                Util.add_dirty_rect(self._surface.blit(
+                    image,
+                    (new_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+                     new_y * Global.BLOCK_SIZE + Global.TOP_PADDING)
+                ))
 
             # add food at random until count >= max_count
-            if self.count < Global.FOOD_MAX_COUNT_PER_KIND and random.randint(1, 4) == 1:
+            if self.count[kind_index] < max_count and self._rng.random() < kind.spawn_weight:
                 continue
 
             break
-
-
-class Apple(FoodBase):
-    def __init__(self) -> None:
-        super().__init__()
-        self.name = "apple"
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/apple_bigger.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.add_satiety = 1
-        self.toxic_level = 0
-        self.add_score = 0
-        self.increase_speed = 0
-        self.increase_length = 1
-
-
-class Beef(FoodBase):
-    def __init__(self) -> None:
-        super().__init__()
-        self.name = "beef"
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/beef_bigger.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.add_satiety = 2
-        self.toxic_level = 0
-        self.add_score = 0
-        self.increase_speed = 0
-        self.increase_length = 2
-
-
-class Iron(FoodBase):
-    def __init__(self) -> None:
-        super().__init__()
-        self.name = "iron"
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/iron_block.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.add_satiety = 1
-        self.toxic_level = 0
-        self.add_score = 2
-        self.increase_speed = 0
-        self.increase_length = 1
-
-
-class Gold(FoodBase):
-    def __init__(self) -> None:
-        super().__init__()
-        self.name = "gold"
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/gold_bigger.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.add_satiety = 2
-        self.toxic_level = 0
-        self.add_score = 4
-        self.increase_speed = 1
-        self.increase_length = 1
-
-
-class SlimeBall(FoodBase):
-    def __init__(self) -> None:
-        super().__init__()
-        self.name = "slimeball"
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/slimeball_bigger.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.add_satiety = 1
-        self.toxic_level = 1
-        self.add_score = 1
-        self.increase_speed = -1
-        self.increase_length = 1
-
-
-class Heart(FoodBase):
-    def __init__(self) -> None:
-        super().__init__()
-        self.name = "heart"
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/heart.png").convert_alpha(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.add_satiety = 1
-        self.toxic_level = -1
-        self.add_score = 1
-        self.increase_speed = 0
-        self.increase_length = 1
@@ -1,23 +1,30 @@
 import getpass
+import os
 import time
-from collections import deque
-from threading import Event, Thread
 
 import pygame
 
 from animation import AnimationManager
 from board import Board, Button, Text
+from env import SnakeEnv
 from event import EventManager
-from food import FoodManager
-from grid import Grid
+from metrics import Histogram, metrics
+from profiler import profiler
+from replay import Replay
 from settings import Global, KeyBoard
-from snake import Direction, Snake
-from util import Action, GameState, Util
-from wall import Wall
+from snake import Direction
+from util import Action, BlurLadder, GameState, SpeedMeter, Util
 
 
-class Game:
-    def __init__(self) -> None:
+_steps_per_frame = metrics.histogram("game_steps_per_frame", Histogram.exponential_buckets(1, 2, 7),
+                                     "snake steps done in one frame of Game.play")
+
+
+class Game(SnakeEnv):
+    # blur kernel sizes of the pause and game-over transitions
+    BLUR_KERNEL_SIZES: tuple[int, ...] = tuple(range(1, 62, 6))
+
+    def __init__(self, seed: int | None = None) -> None:
         pygame.display.set_caption("PySnake")
         pygame.display.set_icon(pygame.image.load("resources/img/icon.png"))
         self.surface = pygame.display.set_mode(Global.SCREEN_SIZE, pygame.RESIZABLE)
@@ -27,40 +34,62 @@ class Game:
         )
         self.clock = pygame.time.Clock()
 
-        self.grid = Grid(Global.GRID_COL, Global.GRID_ROW)
+        super().__init__(self.surface, seed)
         self.animation_manager = AnimationManager(self.grid)
-        self.snake = Snake(self.grid)
-        self.wall = Wall(self.grid)
-        self.food_manager = FoodManager(self.grid, self.surface)
         self.board = Board()
         self.snake_move_timer = Util.timer()
 
-        self.level: int = 1
-        self.score: int = 0
-        self.move_distance: int = 0
-        self.eat_food_count: int = 0
-
-        if Global.SHOW_REAL_SPEED:
-            self.head_deque: deque = deque(maxlen=5)  # store head positions of snake, used to calculate real_speed
-            self.real_speed: int = 0
-            self.calc_speed_running = Event()
-            Thread(target=self.calc_real_speed, daemon=True).start()
-
-    def reset_game(self) -> None:
-        self.grid.clear_all()
-        self.snake.reset()
-        self.wall.reset()
-        self.food_manager.reset()
-        self.snake.health.reset()
-        self.snake.hungry.reset()
-        self.level = 1
-        self.score = 0
-        self.move_distance = 0
-        self.eat_food_count = 0
-        if Global.SHOW_REAL_SPEED:
-            self.calc_speed_running.clear()
-            self.head_deque.clear()
-            self.real_speed = 0
+        # real speed of the snake, unit: block per second
+        self.speed_meter = SpeedMeter()
+
+        # inputs of the current game, saved when the game is reset
+        self.replay: Replay | None = Replay(self.seed) if Global.RECORD_REPLAY else None
+
+    def reset(self, seed: int | None = None) -> None:
+        self.save_replay()
+        super().reset(seed)
+        self.speed_meter.clear()
+        self.replay = Replay(self.seed) if Global.RECORD_REPLAY else None
+
+    def save_replay(self) -> None:
+        if self.replay is None or len(self.replay) == 0:
+            return
+        os.makedirs("replays", exist_ok=True)
+        time_str = time.strftime("%Y%m%d_%H%M%S", time.localtime())
+        name = f"replays/{time_str}_score_{self.get_score()}_seed_{self.replay.seed}"
+        path = f"{name}.rpl"
+        # games of the same seed may end in the same second with the same score
+        count = 1
+        while os.path.exists(path):
+            count += 1
+            path = f"{name}_{count}.rpl"
+        self.replay.save(path)
+        print(f"replay saved to {path}")
+
+    def play_replay(self, replay: Replay, steps_per_second: int = 0) -> None:
+        """
+        replay a game in the window
+
+        :param replay: the replay, its settings must be applied before creating the game
+        :param steps_per_second: replay speed, as fast as possible if 0
+        """
+        self.reset(replay.seed)
+        self.init_game_surface()
+        teleport = bool(replay.settings["TELEPORT"])
+        for step, direction in enumerate(replay.steps(), 1):
+            EventManager.get_event()
+            alive, _, _, _, _ = self.replay_step(direction, teleport=teleport)
+            self.board.add(
+                Text(f"step: {step}/{len(replay)}", pygame.Color("white"), "left_top", alpha=255),
+                Text(f"score: {self.get_score()}  len: {self.snake.length}",
+                     pygame.Color("springgreen"), "right_top", alpha=255),
+                Text(f"level: {self.level}", pygame.Color("chartreuse"), "middle_bottom", alpha=255)
+            )
+            self.update_board()
+            Util.update_screen(dirty_only=True)
+            self.clock.tick(steps_per_second)
+            if not alive:
+                break
 
     def main_menu(self) -> Action:
         self.animation_manager.start()
@@ -75,15 +104,21 @@ class Game:
         self.board.add(start_button, exit_button)
 
         while True:
-            EventManager.get_event()
-            self.board.update_button_status()
-            self.animation_manager.update()
-
-            self.set_base_color(Global.BACK_GROUND_COLOR)
-            self.animation_manager.draw(self.surface)
-            self.draw_banner()
-
-            self.board.draw(self.surface)
+            profiler.next_frame()
+            with profiler.phase("event"):
+                EventManager.get_event()
+                self.board.update_button_status()
+
+            with profiler.phase("animation"):
+                self.animation_manager.update()
+                self.set_base_color(Global.BACK_GROUND_COLOR)
+                self.animation_manager.draw(self.surface)
+
+            with profiler.phase("board"):
+                self.draw_banner()
+                self.board.draw(self.surface)
+                if Global.PROFILE_OVERLAY:
+                    profiler.draw_overlay(self.surface)
 
             if start_button.is_triggered:
                 self.animation_manager.pause()
@@ -93,67 +128,71 @@ class Game:
             if exit_button.is_triggered:
                 return Action.QUIT_GAME
 
-            Util.update_screen()
-            self.clock.tick(Global.FPS)
+            with profiler.phase("update_screen"):
+                Util.update_screen()
+            with profiler.phase("tick"):
+                self.clock.tick(Global.FPS)
 
     def start_game(self) -> tuple[Action, GameState]:
         self.snake_move_timer.set_interval_sec(1 / (1.5 * self.snake.move_speed))
         self.snake_move_timer.start()
-        if Global.SHOW_REAL_SPEED:
-            self.calc_speed_running.set()
         self.init_game_surface()
 
         while True:
-            EventManager.get_event()
+            profiler.next_frame()
+            with profiler.phase("event"):
+                EventManager.get_event()
 
-            alive, result, _, _, _ = self.play(teleport=Global.TELEPORT)
-            speed = f"{self.snake.move_speed} [{self.real_speed} bps]" if Global.SHOW_REAL_SPEED else self.snake.move_speed
-            self.board.add(
-                Text(f"FPS: {round(self.clock.get_fps())}", pygame.Color("white"), "left_top", alpha=255),
-                Text(f"score: {self.get_score()}  len: {self.snake.length}",
-                     pygame.Color("springgreen"), "right_top", alpha=255),
-                Text(f"speed: {speed}", pygame.Color("white"), "middle_top", alpha=255),
-                Text(f"level: {self.level}", pygame.Color("chartreuse"), "middle_bottom", alpha=255)
-            )
-            self.update_board()
-            Util.update_screen()
+            with profiler.phase("play"):
+                alive, result, _, _, _ = self.play(teleport=Global.TELEPORT)
+
+            with profiler.phase("board"):
+                speed = f"{self.snake.move_speed} [{round(self.speed_meter.speed, 1)} bps]" \
+                    if Global.SHOW_REAL_SPEED else self.snake.move_speed
+                self.board.add(
+                    Text(f"FPS: {round(self.clock.get_fps())}", pygame.Color("white"), "left_top", alpha=255),
+                    Text(f"score: {self.get_score()}  len: {self.snake.length}",
+                         pygame.Color("springgreen"), "right_top", alpha=255),
+                    Text(f"speed: {speed}", pygame.Color("white"), "middle_top", alpha=255),
+                    Text(f"level: {self.level}", pygame.Color("chartreuse"), "middle_bottom", alpha=255)
+                )
+                self.update_board()
+                if Global.PROFILE_OVERLAY:
+                    profiler.draw_overlay(self.surface)
+
+            with profiler.phase("update_screen"):
+                Util.update_screen(dirty_only=True)
 
             if EventManager.check_key_or_button(pygame.KEYDOWN, KeyBoard.pause_list) or \
                     EventManager.check_key_or_button(pygame.MOUSEBUTTONDOWN, 3):
                 # enter pause menu
                 self.snake_move_timer.pause()
-                if Global.SHOW_REAL_SPEED:
-                    self.calc_speed_running.clear()
-                    self.head_deque.clear()
+                self.speed_meter.clear()
 
                 next_action = self.pause()
                 if next_action in {Action.START_GAME, Action.MAIN_MENU}:
                     return next_action, result
                 if next_action == Action.CONTINUE:
-                    self.snake_move_timer.start()
-                    if Global.SHOW_REAL_SPEED:
-                        self.calc_speed_running.set()
+                    self.snake_move_timer.resume()
                 else:
                     raise ValueError(f"Invalid action: {next_action}")
 
             if not alive:
                 # game over
                 self.snake_move_timer.pause()
-                if Global.SHOW_REAL_SPEED:
-                    self.calc_speed_running.clear()
-                    self.head_deque.clear()
-                    self.real_speed = 0
+                self.speed_meter.clear()
                 return Action.GAME_OVER, result
 
-            self.clock.tick(Global.FPS)
+            with profiler.phase("tick"):
+                self.clock.tick(Global.FPS)
 
     def play(self, direction: Direction | None = None, full_speed=False, teleport=False) -> \
             tuple[bool, GameState, bool, bool, bool]:
         """
-        control snake to move and update game status
+        control snake to move and update game status, moving as many steps as the timer is due this frame
 
         :param direction: if not None, control snake by `direction`, else control by keyboard
-        :param full_speed: set if snake move at full speed (ignore timer)
+        :param full_speed: set if snake move at full speed (one step per call, ignore timer)
         :param teleport: set if snake can teleport when hit the border
         :return: (alive, game_state, collision_with_food, collision_with_body, collision_with_wall)
         """
@@ -167,29 +206,43 @@ class Game:
             self.snake_move_timer.set_interval_sec(1 / (1.5 * self.snake.move_speed))
             self.snake.speed_changed = False
 
-        status = (True, GameState.PLAYING)
-        collision = (False, False, False)
+        if full_speed:
+            if self.replay is not None:
+                self.replay.record(self.snake.direction)
+            step_result = self.step(teleport=teleport)
+            self.speed_meter.add()
+            return step_result
+
+        # run all steps due since the last frame, the collisions of these steps are merged
+        alive, result = True, GameState.PLAYING
+        collide_with_food = collide_with_body = collide_with_wall = False
+        self.snake_move_timer.update()
+        steps = 0
+        for _ in range(Global.MAX_STEPS_PER_FRAME):
+            if not self.snake_move_timer.consume():
+                break
+            if self.replay is not None:
+                self.replay.record(self.snake.direction)
+            alive, result, cwf, cwb, cww = self.step(teleport=teleport)
+            collide_with_food |= cwf
+            collide_with_body |= cwb
+            collide_with_wall |= cww
+            steps += 1
 
-        if full_speed or self.snake_move_timer.arrived:
-            self.snake.walk(self.surface, teleport=teleport)
-            self.move_distance += 1
-
-            if Global.SHOW_REAL_SPEED:
-                head_pos = (self.snake.x[0], self.snake.y[0])
-                cur_time = time.time()
-                self.head_deque.append((head_pos, cur_time))
-
-            collision = self.check_collision()
-            if collision[0]:
-                # check upgrade after eating food
-                self.check_upgrade()
+            if not alive:
+                break
+            if self.snake.speed_changed:
+                # the following steps of this frame run at the new speed
+                self.snake_move_timer.set_interval_sec(1 / (1.5 * self.snake.move_speed))
+                self.snake.speed_changed = False
+        self.speed_meter.add(steps)
+        _steps_per_frame.observe(steps)
 
-            self.update_hungry_level()
-            status = self.check_alive()
-        return status[0], status[1], collision[0], collision[1], collision[2]
+        return alive, result, collide_with_food, collide_with_body, collide_with_wall
 
     def pause(self) -> Action:
-        blur_surface = pre_surface = self.surface.copy()
+        pre_surface = self.surface.copy()
+        blur_ladder = BlurLadder(pre_surface, self.BLUR_KERNEL_SIZES)
 
         resume_button = Button(
             title="Resume", color=(pygame.Color("white"), pygame.Color("green")), position=(0.5, 0.65)
@@ -205,26 +258,28 @@ class Game:
 
         entering = True
         releasing = False
-        blur_kernel_size = 1
+        blur_index = 0
+        blur_surface = pre_surface
 
         while True:
             EventManager.get_event()
             self.board.update_button_status()
 
             if entering:
-                blur_surface = Util.gaussian_blur(pre_surface, blur_kernel_size)
-                if blur_kernel_size > 60:
+                blur_surface = blur_ladder.get(blur_index)
+                if blur_index >= len(blur_ladder) - 1:
                     entering = False
                 else:
-                    blur_kernel_size += 6
+                    blur_index += 1
 
             if releasing:
-                ''' gradually remove blur before leaving pause page '''
-                blur_surface = Util.gaussian_blur(pre_surface, blur_kernel_size)
-                blur_kernel_size -= 6
-                if blur_kernel_size <= 1:
+                ''' gradually remove blur before leaving pause page, reusing the frames of entering '''
+                blur_surface = blur_ladder.get(blur_index)
+                blur_index -= 1
+                if blur_index <= 0:
                     self.board.clear_button()
                     self.surface.blit(pre_surface, (0, 0))
+                    Util.request_full_update()
                     return Action.CONTINUE
 
             self.surface.blit(blur_surface, (0, 0))
@@ -242,12 +297,12 @@ class Game:
 
             if restart_button.is_triggered:
                 self.board.clear_button()
-                self.reset_game()
+                self.reset()
                 return Action.START_GAME
 
             if back_to_main_menu_button.is_triggered:
                 self.board.clear_button()
-                self.reset_game()
+                self.reset()
                 return Action.MAIN_MENU
 
             Util.update_screen()
@@ -258,14 +313,20 @@ class Game:
         self.wall.draw(self.surface)
         self.snake.draw(self.surface)
         self.food_manager.draw()
+        Util.request_full_update()
 
     def update_board(self) -> None:
         # self.wall.draw(self.surface)
         # self.snake.draw(self.surface)
         # self.food_manager.draw(self.surface)
-        self.surface.fill(Global.STATUS_BAR_COLOR, (0, 0, self.surface.get_width(), Global.TOP_PADDING))
-        self.surface.fill(Global.STATUS_BAR_COLOR, (0, self.surface.get_height() - Global.BOTTOM_PADDING,
-                                                    self.surface.get_width(), Global.BOTTOM_PADDING))
+        # texts on the status bars are redrawn every frame
+        Util.add_dirty_rect(
+            self.surface.fill(Global.STATUS_BAR_COLOR, (0, 0, self.surface.get_width(), Global.TOP_PADDING))
+        )
+        Util.add_dirty_rect(
+            self.surface.fill(Global.STATUS_BAR_COLOR, (0, self.surface.get_height() - Global.BOTTOM_PADDING,
+                                                        self.surface.get_width(), Global.BOTTOM_PADDING))
+        )
         self.snake.health.draw(self.surface)
         self.snake.hungry.draw(self.surface)
         self.board.draw(self.surface)
@@ -283,98 +344,6 @@ class Game:
         elif EventManager.check_key_or_button(pygame.KEYDOWN, KeyBoard.down_list):
             self.snake.change_direction(Direction.DOWN)
 
-    def get_score(self) -> int:
-        return self.snake.length - self.snake.init_length + self.score
-
-    def check_collision(self) -> tuple[bool, bool, bool]:
-        return (
-            self.collide_with_food(),
-            self.collide_with_body(),
-            self.collide_with_wall()
-        )
-
-    def collide_with_food(self) -> bool:
-        for food in self.food_manager.food_list:
-            for i in range(food.count):
-                if self.is_collision(self.snake.x[0], self.snake.y[0], food.x[i], food.y[i]):
-                    food.update(self.grid, self.surface, index=i)
-                    self.snake.hungry.increase_satiety(food.add_satiety)
-                    self.snake.health.increase(-food.toxic_level)
-                    self.snake.increase_length(food.increase_length)
-                    self.snake.increase_speed(food.increase_speed)
-                    self.score += food.add_score
-                    self.eat_food_count += 1
-                    return True
-        return False
-
-    def collide_with_body(self) -> bool:
-        if (self.snake.x[0], self.snake.y[0]) in zip(self.snake.x[4:], self.snake.y[4:]):
-            self.snake.health.increase(-Global.EAT_BODY_DAMAGE)
-            return True
-        return False
-
-    def collide_with_wall(self) -> bool:
-        if self.grid.has_wall(self.snake.x[0], self.snake.y[0]):
-            self.snake.health.increase(-Global.HIT_WALL_DAMAGE)
-            return True
-        return False
-
-    def update_hungry_level(self) -> None:
-        if self.snake.hungry.hungry_step_count > 0 and \
-                self.snake.hungry.hungry_step_count % max(50 - (self.level - 1) * 4, 20) == 0:
-            if self.snake.hungry.get_satiety() > 0:
-                # increase hungry value till satiety -> 0
-                self.snake.hungry.increase_satiety(-1)
-            else:
-                # start to decrease health value
-                self.snake.health.increase(-1)
-
-    def check_upgrade(self) -> None:
-        """
-        Update the level up to MAX_LEVEL and increase movement speed when level-up.
-        """
-        if self.level >= Global.MAX_LEVEL:
-            return
-        if self.get_score() // 20 > self.level - 1:
-            self.snake.increase_speed(1)
-            self.level += 1
-
-    def check_alive(self) -> tuple[bool, GameState]:
-        """
-        check if the snake is alive
-        (snake will also die if there is no space)
-        result: int: PLAYING -> snake alive; FAILED -> snake died; WINNING -> no space(win the game)
-        :return: tuple(snake_alive: bool, result: int)
-        """
-        winning = self.grid.get_empty_count() <= 0
-        failed = self.snake.health.value <= 0
-        alive = not (winning or failed)
-        result = GameState.PLAYING
-        if failed:
-            result = GameState.FAILED
-        if winning:
-            result = GameState.WINNING
-        return alive, result
-
-    def calc_real_speed(self) -> None:
-        """
-        thread: calculate the real-time speed of the snake, unit: block per second
-        """
-        while True:
-            if len(self.head_deque) < self.head_deque.maxlen:    # pyright: ignore[reportOperatorIssue]
-                time.sleep(0.1)
-                continue
-            total_distance = 0
-            for i in range(0, len(self.head_deque) - 1):
-                distance = abs(self.head_deque[i + 1][0][0] - self.head_deque[i][0][0]) + \
-                           abs(self.head_deque[i + 1][0][1] - self.head_deque[i][0][1])
-                total_distance += distance
-            total_time = self.head_deque[-1][1] - self.head_deque[0][1]
-            speed = total_distance / total_time
-            self.real_speed = round(speed, 1)
-            time.sleep(0.1)
-            self.calc_speed_running.wait()
-
     def game_over(self, result: GameState = GameState.FAILED) -> Action:
         """
         the game-over menu
@@ -382,6 +351,7 @@ class Game:
         :return: Action: next_action
         """
         blur_surface = pre_surface = self.surface.copy()
+        blur_ladder = BlurLadder(pre_surface, self.BLUR_KERNEL_SIZES)
         final_score = self.get_score()
         user_name = getpass.getuser()
         # print(f"Your score: {self.get_score()}")
@@ -416,18 +386,18 @@ class Game:
         self.board.add(restart_button, back_to_main_menu_button)
 
         entering = True
-        blur_kernel_size = 1
+        blur_index = 0
 
         while True:
             EventManager.get_event()
             self.board.update_button_status()
 
             if entering:
-                blur_surface = Util.gaussian_blur(pre_surface, blur_kernel_size)
-                if blur_kernel_size > 60:
+                blur_surface = blur_ladder.get(blur_index)
+                if blur_index >= len(blur_ladder) - 1:
                     entering = False
                 else:
-                    blur_kernel_size += 6
+                    blur_index += 1
 
             self.surface.blit(blur_surface, (0, 0))
 
@@ -463,12 +433,12 @@ class Game:
 
             if restart_button.is_triggered:
                 self.board.clear_button()
-                self.reset_game()
+                self.reset()
                 return Action.START_GAME
 
             if back_to_main_menu_button.is_triggered:
                 self.board.clear_button()
-                self.reset_game()
+                self.reset()
                 return Action.MAIN_MENU
 
             Util.update_screen()
@@ -485,7 +455,3 @@ class Game:
         for key, value in data.items():
             print(f"{key}:\t{value}")
         print("----------------")
-
-    @staticmethod
-    def is_collision(x1, y1, x2, y2) -> bool:
-        return x1 == x2 and y1 == y2
@@ -1,24 +1,104 @@
+import random
+
 import numpy as np
 import numpy.typing as npt
 
+from settings import Global
+
 
 class Grid:
-    def __init__(self, width: int, height: int):
+    """
+    Cell values: 0 -> nothing, 101 -> wall, [10, 100) -> food, +100 -> body on sth. (100: body on nothing).
+    The integer methods (`get_value`, `add_body`, `set_food` ...) are the fast path used every step,
+    the string methods (`set_type`, `has_type` ...) translate type names to values and call them.
+    Empty cells are indexed incrementally on every write, so counting and picking empty cells is O(1).
+    `body_count` holds how many snake segments are on each cell, segments stack after the snake grows
+    or runs into itself, the body type is removed from a cell only when the last segment leaves.
+    With `padding`, `contents` is a view into `padded`, which has `padding` cells of wall on each side,
+    so a window around any cell near the border is a single slice of `padded`.
+    """
+
+    NOTHING: int = 0
+    FOOD_MIN: int = 10
+    BODY: int = 100
+    WALL: int = 101
+    BODY_ON_WALL: int = 201
+
+    def __init__(self, width: int, height: int, padding: int = 0):
+        """
+        :param padding: number of wall cells around `contents` in `padded`
+        """
         self.width: int = width
         self.height: int = height
-        self.contents: npt.NDArray[np.uint8] = np.zeros((height, width), dtype=np.uint8)
+        self.padding: int = padding
+        self.padded: npt.NDArray[np.uint8] = np.full((height + 2 * padding, width + 2 * padding), self.WALL,
+                                                     dtype=np.uint8)
+        self.contents: npt.NDArray[np.uint8] = self.padded[padding:padding + height, padding:padding + width]
+        self.contents.fill(0)
+        self.body_count: npt.NDArray[np.uint16] = np.zeros((height, width), dtype=np.uint16)
         self.type_dict: dict[str, int] = {
             'nothing': 0, 'wall': 101, 'body': 100,
             # food: [10, 100)
             'apple': 10, 'beef': 11, 'iron': 12, 'gold': 13, 'slimeball': 14, 'heart': 15
         }
         self.type_dict_inv: dict[int, str] = {v: k for k, v in self.type_dict.items()}
+        # full type name (e.g. `body on apple`) -> cell value
+        self._full_type_dict: dict[str, int] = dict(self.type_dict)
+        for _type, value in self.type_dict.items():
+            if _type != 'body':
+                self._full_type_dict[f"body on {_type}"] = value + 100
+        self._full_type_dict_inv: dict[int, str] = {v: k for k, v in self._full_type_dict.items()}
+
+        # flat indices (y * width + x) of empty cells, and the position of each cell in it (-1 if not empty)
+        self._empty_cells: list[int] = []
+        self._empty_pos: list[int] = []
+        self._rebuild_empty_index()
+
+    def add_food_type(self, name: str, value: int) -> None:
+        """ register a food type, `value` must be in [10, 100) """
+        if not self.FOOD_MIN <= value < self.BODY:
+            raise ValueError(f"Invalid food value: {value}, must be in [{self.FOOD_MIN}, {self.BODY})")
+        if self.type_dict.get(name, value) != value or self.type_dict_inv.get(value, name) != name:
+            raise ValueError(f"Food type '{name}' = {value} conflicts with {self.type_dict}")
+        self.type_dict[name] = value
+        self.type_dict_inv[value] = name
+        self._full_type_dict[name] = value
+        self._full_type_dict[f"body on {name}"] = value + 100
+        self._full_type_dict_inv[value] = name
+        self._full_type_dict_inv[value + 100] = f"body on {name}"
 
     def __getitem__(self, key):
         return self.contents.__getitem__(key)
 
     def __setitem__(self, key, value):
         self.contents.__setitem__(key, value)
+        self._rebuild_empty_index()
+        # one segment on cells with body, keep counts of cells that still have body
+        contents = self.contents
+        has_body = (contents == self.BODY) | (contents == self.BODY_ON_WALL) | \
+            ((contents >= self.BODY + self.FOOD_MIN) & (contents < 2 * self.BODY))
+        self.body_count[~has_body] = 0
+        self.body_count[has_body & (self.body_count == 0)] = 1
+
+    def _rebuild_empty_index(self) -> None:
+        """ rebuild the empty cell index from contents, O(width * height) """
+        self._empty_cells = np.flatnonzero(self.contents == self.NOTHING).tolist()
+        self._empty_pos = [-1] * (self.width * self.height)
+        for pos, cell in enumerate(self._empty_cells):
+            self._empty_pos[cell] = pos
+
+    def _mark_empty(self, cell: int) -> None:
+        self._empty_pos[cell] = len(self._empty_cells)
+        self._empty_cells.append(cell)
+
+    def _unmark_empty(self, cell: int) -> None:
+        # swap-remove: move the last empty cell to the position of `cell`
+        pos = self._empty_pos[cell]
+        last = self._empty_cells.pop()
+        if last != cell:
+            self._empty_cells[pos] = last
+            self._empty_pos[last] = pos
+        self._empty_pos[cell] = -1
 
     def check_type(self, _type: str, dict_only=True) -> None:
         """ check if `_type` in Grid.type_dict, set dict_only=False to allow `body on` sth. """
@@ -45,35 +125,92 @@ class Grid:
         if _value not in self.type_dict.values():
             raise ValueError(f"Invalid value: {_str}, not in {list(self.type_dict.values())}")
 
+    @staticmethod
+    def value_has_body(value: int) -> bool:
+        return 110 <= value < 200 or value == 100 or value == 201
+
+    @staticmethod
+    def value_has_food(value: int) -> bool:
+        return 10 <= value < 100 or 110 <= value < 200
+
+    @staticmethod
+    def value_has_wall(value: int) -> bool:
+        return value == 101 or value == 201
+
     def get_size(self) -> tuple[int, int]:
         return self.width, self.height
 
     def get_value(self, x: int, y: int) -> int:
         """ get the original value of a cell, x: column, y: row, return 101(wall) if out of range """
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.contents[y, x]
+            return self.contents.item(y, x)
         return 101  # wall
 
     def set_value(self, x: int, y: int, value: int) -> None:
-        """ set the original value of a cell, x: column, y: row """
-        self.check_type_value(value)
+        """ set the original value of a cell, x: column, y: row, the value is only checked in debug mode """
+        if Global.DEBUG:
+            self.check_type_value(value)
+        if not self.value_has_body(value):
+            self.body_count[y, x] = 0
+        elif self.body_count.item(y, x) == 0:
+            self.body_count[y, x] = 1
+        self._write(x, y, value)
+
+    def _write(self, x: int, y: int, value: int) -> None:
+        """ write a cell and keep the empty cell index, body count is not touched """
+        old_value = self.contents.item(y, x)
         self.contents[y, x] = value
+        if old_value == self.NOTHING and value != self.NOTHING:
+            self._unmark_empty(y * self.width + x)
+        elif old_value != self.NOTHING and value == self.NOTHING:
+            self._mark_empty(y * self.width + x)
+
+    def get_body_count(self, x: int, y: int) -> int:
+        """ get the count of snake segments on a cell, return 0 if out of range """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.body_count.item(y, x)
+        return 0
+
+    def add_body(self, x: int, y: int, count: int = 1) -> None:
+        """ put `count` segments of body on a cell """
+        old_count = self.body_count.item(y, x)
+        self.body_count[y, x] = old_count + count
+        if old_count == 0 and count > 0:
+            self._write(x, y, self.contents.item(y, x) + self.BODY)
+
+    def remove_body(self, x: int, y: int) -> None:
+        """ remove one segment of body from a cell, the body type is cleared after the last one """
+        count = self.body_count.item(y, x)
+        if count > 1:
+            self.body_count[y, x] = count - 1
+        elif count == 1:
+            self.body_count[y, x] = 0
+            self._write(x, y, self.contents.item(y, x) - self.BODY)
+
+    def clear_body(self, x: int, y: int) -> None:
+        """ remove all segments of body from a cell """
+        if self.body_count.item(y, x) > 0:
+            self.body_count[y, x] = 0
+            self._write(x, y, self.contents.item(y, x) - self.BODY)
+
+    def set_food(self, x: int, y: int, value: int) -> None:
+        """ put food of `value` on an empty cell """
+        if Global.DEBUG and not self.is_empty(x, y):
+            raise ValueError(f"Cannot set food to cell: cell not empty. Current: '{self.get_type(x, y)}'.")
+        self.set_value(x, y, value)
+
+    def remove_food(self, x: int, y: int) -> None:
+        """ remove food from a cell if it has, body on the cell is kept """
+        value = self.contents.item(y, x)
+        if self.value_has_food(value):
+            self._write(x, y, self.BODY if value >= self.BODY else self.NOTHING)
 
     def get_type(self, x: int, y: int, ignore_body=False) -> str:
         """ get the `type` of a cell, return full type (e.g. `body on wall`) unless set ignore_body=True """
         value = self.get_value(x, y)
-        if value < 100:
-            # food or empty
-            return self.type_dict_inv[value]
-        if value == 101:
-            return "wall"
-        if value == 201:
-            return "body on wall"
-
-        # body on food or body on empty
-        value_under_body = value - 100
-        body_on = "body on " if not ignore_body else ""
-        return f"{body_on}{self.type_dict_inv[value_under_body]}"
+        if ignore_body and self.value_has_body(value):
+            value -= 100
+        return self._full_type_dict_inv[value]
 
     def set_type(self, x: int, y: int, new_type: str, replace=False) -> None:
         """
@@ -82,70 +219,73 @@ class Grid:
         set replace=True to replace the content of a cell,
         type: `body on sth.` is allowed in this case or when the cell is empty
         """
-        self.check_type(new_type, dict_only=False)
+        if new_type not in self._full_type_dict:
+            self.check_type(new_type, dict_only=False)
         if replace or self.is_empty(x, y):
-            if new_type.startswith("body on "):
-                # cut it off
-                new_type = new_type[len("body on "):]
-                new_type_value = self.type_dict[new_type] + 100
-            else:
-                new_type_value = self.type_dict[new_type]
-        else:
+            self.set_value(x, y, self._full_type_dict[new_type])
+        elif new_type == 'body':
             # cell not empty, allow only body on something, default
-            old_type = self.get_type(x, y)
-            old_type_value = self.get_value(x, y)
-            if new_type != 'body':
-                raise ValueError(f"Cannot set type '{new_type}' to cell: cell not empty. Current: '{old_type}'.")
-            if self.has_body(x, y):
-                # cell already has body, do not set again
-                new_type_value = old_type_value
-            else:
-                new_type_value = old_type_value + 100
-        self.set_value(x, y, new_type_value)
+            self.set_body(x, y)
+        else:
+            raise ValueError(f"Cannot set type '{new_type}' to cell: cell not empty. Current: '{self.get_type(x, y)}'.")
 
     def set_body(self, x: int, y: int) -> None:
-        self.set_type(x, y, 'body')
+        if not self.has_body(x, y):
+            self.add_body(x, y)
 
     def clear_type(self, x: int, y: int, _type: str) -> None:
         """ clear a specific `_type` of a cell if it has """
         self.check_type(_type, dict_only=True)
-        if self.has_type(x, y, _type):
+        if _type == 'body':
+            self.clear_body(x, y)
+        elif self.has_type(x, y, _type):
             self.set_value(x, y, self.get_value(x, y) - self.type_dict[_type])
 
     def is_type(self, x: int, y: int, _type: str) -> bool:
         """ check if the full type of cell == `_type` """
-        self.check_type(_type, dict_only=False)
-        return self.get_type(x, y) == _type
+        if _type not in self._full_type_dict:
+            self.check_type(_type, dict_only=False)
+        return self.get_value(x, y) == self._full_type_dict[_type]
 
     def is_empty(self, x: int, y: int) -> bool:
         return self.get_value(x, y) == 0
 
     def has_food(self, x: int, y: int) -> bool:
-        value = self.get_value(x, y)
-        return 10 <= value < 100 or 110 <= value < 200
+        return self.value_has_food(self.get_value(x, y))
 
     def has_wall(self, x: int, y: int) -> bool:
-        return self.get_value(x, y) in (101, 201)
+        return self.value_has_wall(self.get_value(x, y))
 
     def has_body(self, x: int, y: int) -> bool:
-        value = self.get_value(x, y)
-        return 110 <= value < 200 or value in (100, 201)
+        return self.value_has_body(self.get_value(x, y))
 
     def has_type(self, x: int, y: int, _type: str) -> bool:
         """ check if cell has a specific `_type` """
         self.check_type(_type, dict_only=True)
-        if self.has_body(x, y):
+        value = self.get_value(x, y)
+        if self.value_has_body(value):
             if _type == 'body':
                 return True
             # type under body
-            current_type = self.get_type(x, y)[len("body on "):]
-        else:
-            current_type = self.get_type(x, y)
-        return current_type == _type
+            value -= 100
+        return value == self.type_dict[_type]
 
     def get_empty_count(self) -> int:
         """ get the count of empty cells """
-        return self.height * self.width - np.count_nonzero(self.contents)
+        return len(self._empty_cells)
+
+    def random_empty_cell(self, rng: random.Random | None = None) -> tuple[int, int] | None:
+        """
+        pick an empty cell uniformly at random, return (x, y) or None if there is no empty cell
+
+        :param rng: random stream to draw from, the global one if None
+        """
+        if not self._empty_cells:
+            return None
+        count = len(self._empty_cells)
+        index = rng.randrange(count) if rng is not None else random.randrange(count)
+        y, x = divmod(self._empty_cells[index], self.width)
+        return x, y
 
     def clear_cell(self, x: int, y: int) -> None:
         """ clear one cell """
@@ -154,6 +294,9 @@ class Grid:
     def clear_all(self) -> None:
         """ clear the entire map """
         self.contents.fill(0)
+        self.body_count.fill(0)
+        self._empty_cells = list(range(self.width * self.height))
+        self._empty_pos = list(range(self.width * self.height))
 
     def display(self) -> None:
         print(self.contents)
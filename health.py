@@ -1,25 +1,28 @@
 import pygame
 
 from settings import Global
+from util import Util
 
 
 class Health:
-    def __init__(self) -> None:
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/heart.png").convert_alpha(),
-            (Global.UI_SCALE, Global.UI_SCALE)
-        )
+    def __init__(self, headless=False) -> None:
+        self.image: pygame.Surface | None = None if headless else \
+            Util.load_image("resources/img/heart.png", (Global.UI_SCALE, Global.UI_SCALE), alpha=True)
         self.value: int = Global.INIT_HEALTH
 
     def reset(self) -> None:
         self.value = Global.INIT_HEALTH
 
     def draw(self, surface: pygame.Surface) -> None:
+        if self.image is None:
+            raise TypeError("Health image is None.")
         for i in range(self.value):
             surface.blit(
                 self.image,
                 (i * self.image.get_width(), surface.get_height() - self.image.get_height())
             )
+        Util.add_dirty_rect(pygame.Rect(0, surface.get_height() - self.image.get_height(),
+                                        Global.MAX_HEALTH * self.image.get_width(), self.image.get_height()))
 
     def increase(self, _value: int) -> None:
         # filter: [0, MAX_HEALTH]
@@ -27,11 +30,9 @@ class Health:
 
 
 class Hungry:
-    def __init__(self) -> None:
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/hunger_bigger.png").convert_alpha(),
-            (Global.UI_SCALE, Global.UI_SCALE)
-        )
+    def __init__(self, headless=False) -> None:
+        self.image: pygame.Surface | None = None if headless else \
+            Util.load_image("resources/img/hunger_bigger.png", (Global.UI_SCALE, Global.UI_SCALE), alpha=True)
         self.hungry_step_count: int = 0
         self._value: int = 0
 
@@ -40,12 +41,17 @@ class Hungry:
         self._value = 0
 
     def draw(self, surface: pygame.Surface) -> None:
+        if self.image is None:
+            raise TypeError("Hungry image is None.")
         for i in range(self.get_satiety()):
             surface.blit(
                 self.image,
                 (surface.get_width() - (i + 1) * self.image.get_width(),
                  surface.get_height() - self.image.get_height())
             )
+        width = Global.MAX_SATIETY * self.image.get_width()
+        Util.add_dirty_rect(pygame.Rect(surface.get_width() - width, surface.get_height() - self.image.get_height(),
+                                        width, self.image.get_height()))
 
     def get_satiety(self) -> int:
         # interval: [0, INIT_SATIETY]
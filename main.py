@@ -1,10 +1,33 @@
 #!/usr/bin/env python3
 
+import argparse
+
+from game import Game
+from replay import Replay, replay_headless
 from state import StateManager
 from util import Util
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", type=str, help="path to a replay file to play back instead of playing")
+    parser.add_argument("--headless", action="store_true", help="replay at full speed without window")
+    parser.add_argument("--speed", type=int, default=0,
+                        help="steps per second of a replay in window, as fast as possible if 0 (default)")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay = Replay.load(args.replay)
+        replay.apply_settings()
+        if args.headless:
+            env = replay_headless(replay)
+        else:
+            env = Game(seed=replay.seed)
+            env.play_replay(replay, args.speed)
+        print(f"replayed {env.move_distance} of {len(replay)} steps, score: {env.get_score()}, "
+              f"length: {env.snake.length}, level: {env.level}")
+        return
+
     state_manager = StateManager()
     state_manager.run()
 
@@ -14,4 +37,4 @@ if __name__ == '__main__':
         main()
     except KeyboardInterrupt:
         print("Keyboard Interrupt.")
-        Util.quit_game()  # ensure timer threads terminated after interrupt
+        Util.quit_game()  # ensure pygame quit after interrupt
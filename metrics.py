@@ -0,0 +1,181 @@
+import atexit
+import bisect
+import os
+import time
+from typing import Sequence, TypeVar
+
+from settings import Global
+
+
+class Counter:
+    """ monotonically increasing value, e.g. number of steps """
+
+    def __init__(self, name: str, help_text: str = "") -> None:
+        self.name: str = name
+        self.help_text: str = help_text
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """ value that goes up and down, e.g. buffer fill """
+
+    def __init__(self, name: str, help_text: str = "") -> None:
+        self.name: str = name
+        self.help_text: str = help_text
+        self.value: float = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    """ distribution of observed values in fixed buckets, e.g. latency """
+
+    def __init__(self, name: str, buckets: Sequence[float], help_text: str = "") -> None:
+        """
+        :param buckets: sorted upper bounds of the buckets, a last bucket of +inf is added
+        """
+        self.name: str = name
+        self.help_text: str = help_text
+        self.buckets: tuple[float, ...] = tuple(buckets)
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0
+
+    @staticmethod
+    def exponential_buckets(start: float, factor: float, count: int) -> tuple[float, ...]:
+        return tuple(start * factor ** i for i in range(count))
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """ upper bound of the bucket holding the `q` quantile, the last bound if it is in the +inf bucket """
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.buckets[-1] if self.buckets else 0
+
+
+Metric = TypeVar("Metric", Counter, Gauge, Histogram)
+
+# latency buckets from 10 us to about 5 s
+LATENCY_BUCKETS: tuple[float, ...] = Histogram.exponential_buckets(1e-5, 2, 20)
+
+
+class MetricsRegistry:
+    """
+    All metrics of the process, created once and updated in place:
+            steps = metrics.counter("env_steps_total", "steps of all envs")
+            steps.inc()
+            metrics.maybe_flush()  # in the loop, writes at most once every `flush_interval` seconds
+    A flush appends the metrics to a CSV file (time, name, value, rate per second) and rewrites a text file
+    in the Prometheus exposition format. Nothing is written while disabled.
+    """
+
+    def __init__(self, enabled: bool = False, directory: str = "metrics", flush_interval: float = 10) -> None:
+        self.enabled: bool = enabled
+        self.directory: str = directory
+        self.flush_interval: float = flush_interval
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+        self._last_flush_time: float = time.perf_counter()
+        self._last_values: dict[str, float] = {}  # values at the last flush, for rates
+
+    def _register(self, metric: Metric) -> Metric:
+        """ register a new metric, or get the registered one of the same name """
+        existing = self._metrics.setdefault(metric.name, metric)
+        if not isinstance(existing, type(metric)):
+            raise ValueError(f"metric {metric.name} is already registered as {type(existing).__name__}")
+        return existing
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS, help_text: str = "") -> Histogram:
+        return self._register(Histogram(name, buckets, help_text))
+
+    def maybe_flush(self) -> None:
+        if self.enabled and time.perf_counter() - self._last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        now = time.perf_counter()
+        elapsed = now - self._last_flush_time
+        self._last_flush_time = now
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_csv(elapsed)
+        self._write_prometheus()
+
+    def _write_csv(self, elapsed: float) -> None:
+        path = os.path.join(self.directory, "metrics.csv")
+        new_file = not os.path.exists(path)
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        rows = []
+        for name, metric in self._metrics.items():
+            if isinstance(metric, Histogram):
+                # rate of observations, and mean and quantiles of all observations
+                values = {"count": metric.count, "mean": metric.sum / metric.count if metric.count else 0,
+                          "p50": metric.quantile(0.5), "p99": metric.quantile(0.99)}
+                for suffix, value in values.items():
+                    rate = self._rate(f"{name}_{suffix}", value, elapsed) if suffix == "count" else ""
+                    rows.append(f"{timestamp},{name}_{suffix},{value},{rate}")
+            else:
+                rate = self._rate(name, metric.value, elapsed) if isinstance(metric, Counter) else ""
+                rows.append(f"{timestamp},{name},{metric.value},{rate}")
+        with open(path, "a") as file:
+            if new_file:
+                file.write("time,name,value,rate_per_sec\n")
+            file.write("\n".join(rows) + "\n")
+
+    def _rate(self, key: str, value: float, elapsed: float) -> float:
+        last = self._last_values.get(key, 0)
+        self._last_values[key] = value
+        return (value - last) / elapsed if elapsed > 0 else 0
+
+    def _write_prometheus(self) -> None:
+        lines = []
+        for name, metric in self._metrics.items():
+            if metric.help_text:
+                lines.append(f"# HELP {name} {metric.help_text}")
+            if isinstance(metric, Histogram):
+                lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {metric.count}')
+                lines.append(f"{name}_sum {metric.sum}")
+                lines.append(f"{name}_count {metric.count}")
+            else:
+                lines.append(f"# TYPE {name} {'counter' if isinstance(metric, Counter) else 'gauge'}")
+                lines.append(f"{name} {metric.value}")
+        # replace the file at once, a reader never sees a partial file
+        path = os.path.join(self.directory, "metrics.prom")
+        with open(f"{path}.tmp", "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.tmp", path)
+
+    def flush_at_exit(self) -> None:
+        atexit.register(self._flush_if_enabled)
+
+    def _flush_if_enabled(self) -> None:
+        if self.enabled:
+            self.flush()
+
+
+# shared by the game and the training
+metrics = MetricsRegistry(Global.METRICS, Global.METRICS_DIR, Global.METRICS_FLUSH_SEC)
+metrics.flush_at_exit()
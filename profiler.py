@@ -0,0 +1,166 @@
+import atexit
+import contextlib
+import json
+import time
+from typing import ContextManager
+
+import numpy as np
+import numpy.typing as npt
+import pygame
+
+from settings import Global
+from util import Util
+
+
+class _Phase:
+    """ context manager timing one phase, reused for every sample of the phase """
+    __slots__ = ("_profiler", "_phase_id", "_start")
+
+    def __init__(self, profiler: 'FrameProfiler', phase_id: int) -> None:
+        self._profiler: FrameProfiler = profiler
+        self._phase_id: int = phase_id
+        self._start: int = 0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info) -> None:
+        self._profiler.record(self._phase_id, self._start, time.perf_counter_ns())
+
+
+class FrameProfiler:
+    """
+    Time the phases of each frame of a loop:
+            profiler.next_frame()  # at the beginning of each frame
+            with profiler.phase("play"):
+                ...
+    Samples (frame, phase, start, duration) are kept in a fixed-size ring buffer, the oldest are overwritten.
+    The whole frame is recorded as the phase "frame". A phase must not be nested in itself.
+    When disabled, `phase` returns a shared no-op context and `next_frame` returns at once.
+    """
+
+    FRAME: str = "frame"
+
+    def __init__(self, enabled: bool = False, capacity: int = 1 << 16, window: int = 60) -> None:
+        """
+        :param enabled: record samples
+        :param capacity: max number of samples kept
+        :param window: number of recent frames averaged by the overlay
+        """
+        self.enabled: bool = enabled
+        self.capacity: int = capacity
+        self.window: int = window
+
+        self.frame_index: int = -1
+        self._frame_start: int = 0
+        self._count: int = 0  # number of samples recorded, including the overwritten ones
+        self._frames: npt.NDArray[np.int64] = np.zeros(capacity, dtype=np.int64)
+        self._phase_ids: npt.NDArray[np.int16] = np.zeros(capacity, dtype=np.int16)
+        self._starts: npt.NDArray[np.int64] = np.zeros(capacity, dtype=np.int64)
+        self._durations: npt.NDArray[np.int64] = np.zeros(capacity, dtype=np.int64)
+
+        self.phase_names: list[str] = []
+        self._phases: dict[str, _Phase] = {}
+        self._null_phase: ContextManager[None] = contextlib.nullcontext()
+        self._font: pygame.font.Font | None = None
+        self._phase(self.FRAME)
+
+    def _phase(self, name: str) -> _Phase:
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self, len(self.phase_names))
+            self.phase_names.append(name)
+        return phase
+
+    def phase(self, name: str) -> ContextManager[None]:
+        """ context manager timing the phase `name` of the current frame """
+        if not self.enabled:
+            return self._null_phase
+        return self._phases.get(name) or self._phase(name)
+
+    def next_frame(self) -> None:
+        """ end the current frame and begin the next one """
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        if self.frame_index >= 0:
+            self.record(0, self._frame_start, now)
+        self.frame_index += 1
+        self._frame_start = now
+
+    def record(self, phase_id: int, start: int, end: int) -> None:
+        index = self._count % self.capacity
+        self._frames[index] = self.frame_index
+        self._phase_ids[index] = phase_id
+        self._starts[index] = start
+        self._durations[index] = end - start
+        self._count += 1
+
+    def clear(self) -> None:
+        self.frame_index = -1
+        self._count = 0
+
+    def _valid(self) -> slice:
+        return slice(0, min(self._count, self.capacity))
+
+    def average_ms(self) -> dict[str, float]:
+        """ average time of each phase per frame in the last `window` frames, unit: ms """
+        frame_count = min(self.window, self.frame_index)
+        if frame_count <= 0:
+            return {}
+        valid = self._valid()
+        # completed frames only, the current one is still running
+        recent = (self._frames[valid] >= self.frame_index - frame_count) & (self._frames[valid] < self.frame_index)
+        totals = np.bincount(self._phase_ids[valid][recent], weights=self._durations[valid][recent],
+                             minlength=len(self.phase_names))
+        return {name: float(totals[i]) / frame_count / 1e6 for i, name in enumerate(self.phase_names)}
+
+    def draw_overlay(self, surface: pygame.Surface, position: tuple[int, int] = (0, Global.TOP_PADDING)) -> None:
+        """ draw the average time of each phase on a panel, the panel covers what is under it """
+        if not self.enabled:
+            return
+        if self._font is None:
+            self._font = pygame.font.Font(None, 20)
+        lines = [f"{name}: {ms:.2f} ms" for name, ms in self.average_ms().items()]
+        if not lines:
+            return
+        line_height = self._font.get_linesize()
+        panel = pygame.Rect(position, (150, line_height * len(lines) + 4))
+        Util.add_dirty_rect(surface.fill(Global.STATUS_BAR_COLOR, panel))
+        for i, line in enumerate(lines):
+            surface.blit(self._font.render(line, True, pygame.Color("white")),
+                         (panel.x + 4, panel.y + 2 + i * line_height))
+
+    def export_chrome_trace(self, path: str) -> None:
+        """ save the samples as Chrome trace events, open with chrome://tracing or https://ui.perfetto.dev """
+        valid = self._valid()
+        order = np.argsort(self._starts[valid], kind="stable")
+        events = []
+        for i in order:
+            phase_id = int(self._phase_ids[i])
+            events.append({
+                "name": self.phase_names[phase_id],
+                "ph": "X",
+                "ts": int(self._starts[i]) / 1e3,
+                "dur": int(self._durations[i]) / 1e3,
+                "pid": 0,
+                # frames on their own row, phases below them
+                "tid": 0 if phase_id == 0 else 1,
+                "args": {"frame": int(self._frames[i])},
+            })
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        print(f"profile trace saved to {path}")
+
+    def export_at_exit(self, path: str) -> None:
+        """ export the trace when the program exits, if anything was recorded """
+        atexit.register(self._export_if_recorded, path)
+
+    def _export_if_recorded(self, path: str) -> None:
+        if self._count > 0:
+            self.export_chrome_trace(path)
+
+
+# shared by the loops of the game and the training
+profiler = FrameProfiler(Global.PROFILE)
+profiler.export_at_exit(Global.PROFILE_TRACE_PATH)
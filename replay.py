@@ -0,0 +1,107 @@
+import struct
+import zlib
+from typing import Iterator
+
+from env import SnakeEnv
+from settings import Global
+from snake import Direction
+
+
+class Replay:
+    """
+    Seed of a game, the settings its logic depends on, and the direction of each step.
+    Stepping a SnakeEnv reset with the seed by these directions reproduces the game exactly.
+
+    File layout (little-endian): MAGIC, seed (u32), step count (u32), one i32 for each of SETTINGS,
+    then the zlib-compressed directions, one byte per step.
+    """
+
+    MAGIC: bytes = b"PYSNAKE\x01"
+    # settings affecting the game logic, INIT_POS is stored as INIT_POS_X and INIT_POS_Y
+    SETTINGS: tuple[str, ...] = (
+        "GRID_COL", "GRID_ROW", "INIT_LENGTH", "INIT_POS_X", "INIT_POS_Y", "INIT_HEALTH", "MAX_HEALTH",
+        "INIT_SATIETY", "MAX_SATIETY", "MAX_LEVEL", "FOOD_MAX_COUNT_PER_KIND", "WALL_COUNT_IN_THOUSANDTHS",
+        "HIT_WALL_DAMAGE", "EAT_BODY_DAMAGE", "TELEPORT", "WITH_AI"
+    )
+    _HEADER: struct.Struct = struct.Struct(f"<8sII{len(SETTINGS)}i")
+
+    def __init__(self, seed: int, settings: dict[str, int] | None = None, directions: bytes = b"") -> None:
+        """
+        :param seed: seed of the game, as `SnakeEnv.seed`
+        :param settings: values of SETTINGS, taken from Global if None
+        :param directions: `Direction.value` of each step
+        """
+        self.seed: int = seed
+        self.settings: dict[str, int] = settings if settings is not None else self.current_settings()
+        self.directions: bytearray = bytearray(directions)
+
+    def __len__(self) -> int:
+        return len(self.directions)
+
+    @classmethod
+    def current_settings(cls) -> dict[str, int]:
+        settings = {}
+        for name in cls.SETTINGS:
+            if name == "INIT_POS_X":
+                settings[name] = Global.INIT_POS[0]
+            elif name == "INIT_POS_Y":
+                settings[name] = Global.INIT_POS[1]
+            else:
+                settings[name] = int(getattr(Global, name))
+        return settings
+
+    def apply_settings(self) -> None:
+        """ write the recorded settings to Global, must be called before creating the env to replay on """
+        for name, value in self.settings.items():
+            if name in {"INIT_POS_X", "INIT_POS_Y"}:
+                continue
+            setattr(Global, name, bool(value) if isinstance(getattr(Global, name), bool) else value)
+        Global.INIT_POS = (self.settings["INIT_POS_X"], self.settings["INIT_POS_Y"])
+        Global.SCREEN_SIZE = (Global.GRID_COL * Global.BLOCK_SIZE + Global.LEFT_PADDING + Global.RIGHT_PADDING,
+                              Global.GRID_ROW * Global.BLOCK_SIZE + Global.TOP_PADDING + Global.BOTTOM_PADDING)
+
+    def record(self, direction: Direction) -> None:
+        """ record the direction the snake moves in at the next step """
+        self.directions.append(direction.value)
+
+    def steps(self) -> Iterator[Direction]:
+        """ iterate the recorded direction of each step """
+        for value in self.directions:
+            yield Direction(value)
+
+    def save(self, path: str) -> None:
+        header = self._HEADER.pack(
+            self.MAGIC, self.seed, len(self.directions), *(self.settings[name] for name in self.SETTINGS)
+        )
+        with open(path, "wb") as file:
+            file.write(header)
+            file.write(zlib.compress(bytes(self.directions), 9))
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) < cls._HEADER.size or not data.startswith(cls.MAGIC):
+            raise ValueError(f"{path} is not a replay file")
+        magic, seed, step_count, *values = cls._HEADER.unpack_from(data)
+        directions = zlib.decompress(data[cls._HEADER.size:])
+        if len(directions) != step_count:
+            raise ValueError(f"replay {path} is broken: {len(directions)} of {step_count} steps found")
+        return cls(seed, dict(zip(cls.SETTINGS, values)), directions)
+
+
+def replay_headless(replay: Replay) -> SnakeEnv:
+    """
+    replay a game at full speed without window
+
+    :return: the env at the end of the replay
+    """
+    replay.apply_settings()
+    env = SnakeEnv(seed=replay.seed)
+    env.reset(replay.seed)
+    teleport = bool(replay.settings["TELEPORT"])
+    for direction in replay.steps():
+        alive, _, _, _, _ = env.replay_step(direction, teleport=teleport)
+        if not alive:
+            break
+    return env
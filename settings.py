@@ -17,6 +17,9 @@ class Global:
     GRID_COL: int = 80
     GRID_ROW: int = 50
 
+    # cells of wall around the grid array, the AI observes a window around the head with a single slice
+    GRID_PADDING: int = 5
+
     # do not change this variable
     SCREEN_SIZE: tuple[int, int] = (GRID_COL * BLOCK_SIZE + LEFT_PADDING + RIGHT_PADDING,
                                     GRID_ROW * BLOCK_SIZE + TOP_PADDING + BOTTOM_PADDING)
@@ -26,6 +29,7 @@ class Global:
     STATUS_BAR_COLOR: tuple[int, int, int] = (14, 29, 48)
 
     FPS: int = 60
+    MAX_STEPS_PER_FRAME: int = 64  # catch-up steps of the snake in one frame, MAX_SPEED needs 1.5 * 1000 / FPS
 
     # === snake ===
     INIT_LENGTH: int = 3
@@ -51,6 +55,14 @@ class Global:
     EAT_BODY_DAMAGE: int = 1  # the reduction of health when the snake hits itself
     TELEPORT: bool = True  # whether the snake can teleport when it hits the border
     WITH_AI: bool = False  # whether to train the AI
+    DEBUG: bool = False  # validate every write to the grid
+    PROFILE: bool = False  # time the phases of each frame, saved to PROFILE_TRACE_PATH at exit, see profiler.py
+    PROFILE_OVERLAY: bool = False  # show the average time of each phase on screen when profiling
+    PROFILE_TRACE_PATH: str = "profile_trace.json"
+    METRICS: bool = False  # write counters and histograms of the training to METRICS_DIR, see metrics.py
+    METRICS_DIR: str = "metrics"
+    METRICS_FLUSH_SEC: float = 10
+    RECORD_REPLAY: bool = False  # save the seed and inputs of each game to `replays/`, see replay.py
 
 
 class KeyBoard:
@@ -0,0 +1,126 @@
+import ctypes
+import multiprocessing.sharedctypes
+
+import numpy as np
+import numpy.typing as npt
+import torch
+
+
+class TransitionRing:
+    """
+    Ring of transitions in shared memory, written by one process and read by another, without lock.
+    Each transition is one float32 row: state, next state, action, reward, done.
+    Each counter is only advanced by one side: the writer fills a row before it advances the write counter,
+    and the reader copies rows before it advances the read counter, so neither sees a partial row.
+    This relies on aligned int64 stores being atomic and seen in the order they are made, which holds on x86 only,
+    see `AI.train_with_actors`. Without lock, a process killed at any point can not block the other one.
+    Must be passed to the other process when it is started.
+    """
+
+    def __init__(self, capacity: int, state_dim: int) -> None:
+        self.capacity: int = capacity
+        self.state_dim: int = state_dim
+        self._written = multiprocessing.sharedctypes.RawValue(ctypes.c_int64, 0)  # only advanced by the writer
+        self._read = multiprocessing.sharedctypes.RawValue(ctypes.c_int64, 0)  # only advanced by the reader
+        self._data = multiprocessing.sharedctypes.RawArray(ctypes.c_float, capacity * (2 * state_dim + 3))
+        self._make_views()
+
+    def _make_views(self) -> None:
+        self._rows: npt.NDArray[np.float32] = np.frombuffer(self._data, dtype=np.float32).reshape(self.capacity, -1)
+
+    def __getstate__(self) -> dict:
+        return {"capacity": self.capacity, "state_dim": self.state_dim,
+                "_written": self._written, "_read": self._read, "_data": self._data}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._make_views()
+
+    def __len__(self) -> int:
+        return self._written.value - self._read.value
+
+    def push(self, state: npt.NDArray, action: int, reward: float, next_state: npt.NDArray, done: bool) -> bool:
+        """ write one transition, False if the ring is full """
+        written = self._written.value
+        if written - self._read.value >= self.capacity:
+            return False
+        row = self._rows[written % self.capacity]
+        row[:self.state_dim] = state
+        row[self.state_dim:-3] = next_state
+        row[-3:] = action, reward, done
+        self._written.value = written + 1
+        return True
+
+    def peek(self) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
+        """
+        the oldest unread transitions, up to the end of the ring
+
+        :return: views (states, actions, rewards, next_states, dones), valid until `release`
+        """
+        read = self._read.value
+        start = read % self.capacity
+        end = start + min(self._written.value - read, self.capacity - start)
+        rows = self._rows[start:end]
+        state_dim = self.state_dim
+        return rows[:, :state_dim], rows[:, -3], rows[:, -2], rows[:, state_dim:-3], rows[:, -1]
+
+    def release(self, count: int) -> None:
+        """ mark `count` peeked transitions as read, the writer may overwrite them """
+        self._read.value += count
+
+
+class SharedWeights:
+    """
+    Parameters of a module in shared memory, published by one process and copied into modules of the same
+    architecture by others. The version is odd while publishing, a copy made during a publish is retried.
+    """
+
+    def __init__(self, module: torch.nn.Module) -> None:
+        size = sum(parameter.numel() for parameter in module.parameters())
+        self._version = multiprocessing.sharedctypes.RawArray(ctypes.c_int64, 1)
+        self._data = multiprocessing.sharedctypes.RawArray(ctypes.c_float, size)
+        self._make_views()
+
+    def _make_views(self) -> None:
+        self._versions: npt.NDArray[np.int64] = np.frombuffer(self._version, dtype=np.int64)
+        self._vector: torch.Tensor = torch.from_numpy(np.frombuffer(self._data, dtype=np.float32))
+
+    def __getstate__(self) -> dict:
+        return {"_version": self._version, "_data": self._data}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._make_views()
+
+    @property
+    def version(self) -> int:
+        return int(self._versions[0])
+
+    def publish(self, module: torch.nn.Module) -> None:
+        self._versions[0] += 1
+        offset = 0
+        with torch.no_grad():
+            for parameter in module.parameters():
+                size = parameter.numel()
+                self._vector[offset:offset + size].copy_(parameter.view(-1))
+                offset += size
+        self._versions[0] += 1
+
+    def copy_to(self, module: torch.nn.Module, version: int) -> int:
+        """
+        copy the parameters into `module` if they were published after `version`
+
+        :param version: version of the parameters in `module`
+        :return: the new version of the parameters in `module`
+        """
+        latest = self.version
+        if latest == version or latest % 2 == 1:
+            return version
+        offset = 0
+        with torch.no_grad():
+            for parameter in module.parameters():
+                size = parameter.numel()
+                parameter.view(-1).copy_(self._vector[offset:offset + size])
+                offset += size
+        # published again while copying, the parameters may be mixed, copy them at the next call
+        return latest if self.version == latest else version
@@ -1,4 +1,5 @@
 import enum
+from typing import Iterator
 
 import pygame
 
@@ -18,30 +19,131 @@ class Direction(enum.Enum):
     NONE = 4
 
 
+class BodyView:
+    """ read-only sequence of one coordinate (x or y) of SnakeBody, index 0 is the head """
+
+    def __init__(self, body: 'SnakeBody', axis: int) -> None:
+        self._body: SnakeBody = body
+        self._axis: int = axis
+
+    def __len__(self) -> int:
+        return self._body.length
+
+    def __getitem__(self, key: int | slice) -> int | list[int]:
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(self._body.length))]
+        length = self._body.length
+        if key < 0:
+            key += length
+        if not 0 <= key < length:
+            raise IndexError("snake body index out of range")
+        body = self._body
+        return body.data[self._axis][(body.head + key) % body.capacity]
+
+    def __iter__(self) -> Iterator[int]:
+        for coord in self._body.coords():
+            yield coord[self._axis]
+
+
+class SnakeBody:
+    """
+    Ring buffer of body coordinates, index 0 is the head.
+    The head moves backward in the ring, so a step writes one element and the tail is dropped by keeping the length.
+    The capacity is doubled if the body grows longer than it.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = max(capacity, 1)
+        self.data: tuple[list[int], list[int]] = ([0] * self.capacity, [0] * self.capacity)
+        self.head: int = 0
+        self.length: int = 0
+        self.x: BodyView = BodyView(self, 0)
+        self.y: BodyView = BodyView(self, 1)
+
+    def reset(self, xs: list[int], ys: list[int]) -> None:
+        """ place the body from head (index 0) to tail """
+        if len(xs) > self.capacity:
+            self._resize(len(xs) * 2)
+        self.head = 0
+        self.length = len(xs)
+        self.data[0][:self.length] = xs
+        self.data[1][:self.length] = ys
+
+    def get_head(self) -> tuple[int, int]:
+        return self.data[0][self.head], self.data[1][self.head]
+
+    def get_tail(self) -> tuple[int, int]:
+        tail = (self.head + self.length - 1) % self.capacity
+        return self.data[0][tail], self.data[1][tail]
+
+    def push_head(self, x: int, y: int) -> None:
+        """ add a new head and drop the tail """
+        self.head = (self.head - 1) % self.capacity
+        self.data[0][self.head] = x
+        self.data[1][self.head] = y
+
+    def extend_tail(self, count: int) -> None:
+        """ append `count` copies of the tail """
+        if self.length + count > self.capacity:
+            self._resize(max(self.capacity * 2, self.length + count))
+        tail_x, tail_y = self.get_tail()
+        for i in range(self.length, self.length + count):
+            index = (self.head + i) % self.capacity
+            self.data[0][index] = tail_x
+            self.data[1][index] = tail_y
+        self.length += count
+
+    def coords(self, start: int = 0) -> Iterator[tuple[int, int]]:
+        """ iterate (x, y) of segments from index `start` to the tail """
+        begin = self.head + start
+        end = self.head + self.length
+        xs, ys = self.data
+        if end <= self.capacity:
+            yield from zip(xs[begin:end], ys[begin:end])
+            return
+        if begin < self.capacity:
+            yield from zip(xs[begin:], ys[begin:])
+        yield from zip(xs[max(begin - self.capacity, 0):end - self.capacity],
+                       ys[max(begin - self.capacity, 0):end - self.capacity])
+
+    def _resize(self, capacity: int) -> None:
+        coords = list(self.coords())
+        self.capacity = capacity
+        self.data = ([0] * capacity, [0] * capacity)
+        self.head = 0
+        for i, (x, y) in enumerate(coords):
+            self.data[0][i] = x
+            self.data[1][i] = y
+
+
 class Snake:
-    def __init__(self, grid: Grid) -> None:
-        self.head_block = pygame.transform.scale(
-            pygame.image.load("resources/img/yellow-fdd926-10x10.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.body_block = pygame.transform.scale(
-            pygame.image.load("resources/img/green-23d12f-10x10.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
-        self.wall_image = pygame.transform.scale(
-            pygame.image.load("resources/img/grey-e6e6e6-10x10.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
+    def __init__(self, grid: Grid, headless=False, reg_grid=True) -> None:
+        """
+        :param grid: the grid to register body to
+        :param headless: do not load any image, the snake can not be drawn in this case
+        :param reg_grid: register body type of the initial segments to grid cells
+        """
+        self.head_block: pygame.Surface | None = None
+        self.body_block: pygame.Surface | None = None
+        self.wall_image: pygame.Surface | None = None
+        if not headless:
+            block_size = (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
+            self.head_block = Util.load_image("resources/img/yellow-fdd926-10x10.png", block_size)
+            self.body_block = Util.load_image("resources/img/green-23d12f-10x10.png", block_size)
+            self.wall_image = Util.load_image("resources/img/grey-e6e6e6-10x10.png", block_size)
 
         self._grid: Grid = grid
-        self.health: Health = Health()
-        self.hungry: Hungry = Hungry()
+        self.health: Health = Health(headless)
+        self.hungry: Hungry = Hungry(headless)
         self.init_length: int = Global.INIT_LENGTH
-        self.length: int = self.init_length
-        self.x = [Global.INIT_POS[0] + (self.length - i - 1) for i in range(self.length)]
-        self.y = [Global.INIT_POS[1]] * self.length
-        for i in range(self.length):
-            self._grid.set_type(self.x[i], self.y[i], 'body')
+        self.body: SnakeBody = SnakeBody(Global.GRID_COL * Global.GRID_ROW)
+        self.x: BodyView = self.body.x
+        self.y: BodyView = self.body.y
+        self.set_body(
+            [Global.INIT_POS[0] + (self.init_length - i - 1) for i in range(self.init_length)],
+            [Global.INIT_POS[1]] * self.init_length,
+            reg_grid
+        )
 
         self.move_speed: int = Global.INIT_SPEED
         self.speed_changed: bool = False
@@ -49,12 +151,26 @@ class Snake:
         self.direction_buffer: Direction = Direction.NONE
         self.changing_direction: bool = False
 
+    @property
+    def length(self) -> int:
+        return self.body.length
+
+    def set_body(self, xs: list[int], ys: list[int], reg_grid=True) -> None:
+        """
+        place the snake, xs and ys are listed from head to tail
+
+        :param reg_grid: register body type of all segments to grid cells
+        """
+        self.body.reset(xs, ys)
+        if reg_grid:
+            for x, y in zip(xs, ys):
+                self._grid.add_body(x, y)
+
     def reset(self) -> None:
-        self.length = self.init_length
-        self.x = [Global.INIT_POS[0] + (self.length - i - 1) for i in range(self.length)]
-        self.y = [Global.INIT_POS[1]] * self.length
-        for i in range(self.length):
-            self._grid.set_type(self.x[i], self.y[i], 'body')
+        self.set_body(
+            [Global.INIT_POS[0] + (self.init_length - i - 1) for i in range(self.init_length)],
+            [Global.INIT_POS[1]] * self.init_length
+        )
 
         self.move_speed = Global.INIT_SPEED
         self.speed_changed = False
@@ -63,16 +179,19 @@ class Snake:
         self.changing_direction = False
 
     def draw(self, surface: pygame.Surface) -> None:
+        if self.head_block is None or self.body_block is None:
+            raise TypeError("Snake image is None.")
+        head_x, head_y = self.body.get_head()
         surface.blit(
             self.head_block,
-            (self.x[0] * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-             self.y[0] * Global.BLOCK_SIZE + Global.TOP_PADDING)
+            (head_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+             head_y * Global.BLOCK_SIZE + Global.TOP_PADDING)
         )
-        for i in range(1, self.length):
+        for x, y in self.body.coords(1):
             surface.blit(
                 self.body_block,
-                (self.x[i] * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-                 self.y[i] * Global.BLOCK_SIZE + Global.TOP_PADDING)
+                (x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+                 y * Global.BLOCK_SIZE + Global.TOP_PADDING)
             )
 
     def change_direction(self, target_direction: Direction) -> bool:
@@ -103,69 +222,76 @@ class Snake:
         :return:
         """
 
-        # save tail
-        old_tail_x, old_tail_y = self.x[-1], self.y[-1]
-
-        # move body from tail to neck
-        for i in range(self.length - 1, 0, -1):
-            self.x[i] = self.x[i - 1]
-            self.y[i] = self.y[i - 1]
+        # save tail and neck (the old head)
+        old_tail_x, old_tail_y = self.body.get_tail()
+        neck_x, neck_y = head_x, head_y = self.body.get_head()
 
         # move head
         if self.direction == Direction.LEFT:
-            self.x[0] -= 1
+            head_x -= 1
         elif self.direction == Direction.RIGHT:
-            self.x[0] += 1
+            head_x += 1
         elif self.direction == Direction.UP:
-            self.y[0] -= 1
+            head_y -= 1
         elif self.direction == Direction.DOWN:
-            self.y[0] += 1
+            head_y += 1
 
-        if not Util.is_inside_border(self.x[0], self.y[0]):
+        if not Util.is_inside_border(head_x, head_y):
             # head over border
             if teleport:
                 # teleport head if is over border after movement
-                if self.x[0] < 0:
-                    self.x[0] = Global.GRID_COL - 1
-                elif self.x[0] >= Global.GRID_COL:
-                    self.x[0] = 0
-                if self.y[0] < 0:
-                    self.y[0] = Global.GRID_ROW - 1
-                elif self.y[0] >= Global.GRID_ROW:
-                    self.y[0] = 0
-
-        if Util.is_inside_border(self.x[0], self.y[0]):
+                if head_x < 0:
+                    head_x = Global.GRID_COL - 1
+                elif head_x >= Global.GRID_COL:
+                    head_x = 0
+                if head_y < 0:
+                    head_y = Global.GRID_ROW - 1
+                elif head_y >= Global.GRID_ROW:
+                    head_y = 0
+
+        # the new head takes the place of the old tail in the ring buffer
+        self.body.push_head(head_x, head_y)
+
+        if Util.is_inside_border(head_x, head_y):
             # head inside border
             if reg_grid:
                 # register body type of new head to grid cell
-                self._grid.set_type(self.x[0], self.y[0], 'body')
+                self._grid.add_body(head_x, head_y)
             if surface is not None:
                 # draw head
-                surface.blit(self.head_block, (self.x[0] * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-                                               self.y[0] * Global.BLOCK_SIZE + Global.TOP_PADDING))
+                Util.add_dirty_rect(
+                    surface.blit(self.head_block, (head_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+                                                   head_y * Global.BLOCK_SIZE + Global.TOP_PADDING))
+                )
 
-        if Util.is_inside_border(self.x[1], self.y[1]):
+        if Util.is_inside_border(neck_x, neck_y):
             # neck inside border
             if surface is not None:
                 # draw neck
-                surface.blit(self.body_block, (self.x[1] * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-                                               self.y[1] * Global.BLOCK_SIZE + Global.TOP_PADDING))
+                Util.add_dirty_rect(
+                    surface.blit(self.body_block, (neck_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+                                                   neck_y * Global.BLOCK_SIZE + Global.TOP_PADDING))
+                )
 
         if Util.is_inside_border(old_tail_x, old_tail_y):
             # old tail inside border
-            if reg_grid and (old_tail_x, old_tail_y) not in zip(self.x, self.y):
-                # unset old tail's body type from the grid cell if it does not collide with body
-                self._grid.clear_type(old_tail_x, old_tail_y, 'body')
+            if reg_grid:
+                # unregister old tail, the body type is kept while other segments are still on the cell
+                self._grid.remove_body(old_tail_x, old_tail_y)
             if surface is not None:
                 # erase tail from surface
                 if self._grid.is_empty(old_tail_x, old_tail_y):
-                    surface.fill(Global.BACK_GROUND_COLOR,
-                                 (old_tail_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-                                  old_tail_y * Global.BLOCK_SIZE + Global.TOP_PADDING,
-                                  Global.BLOCK_SIZE, Global.BLOCK_SIZE))
+                    Util.add_dirty_rect(
+                        surface.fill(Global.BACK_GROUND_COLOR,
+                                     (old_tail_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+                                      old_tail_y * Global.BLOCK_SIZE + Global.TOP_PADDING,
+                                      Global.BLOCK_SIZE, Global.BLOCK_SIZE))
+                    )
                 elif self._grid.has_wall(old_tail_x, old_tail_y):
-                    surface.blit(self.wall_image, (old_tail_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
-                                                   old_tail_y * Global.BLOCK_SIZE + Global.TOP_PADDING))
+                    Util.add_dirty_rect(
+                        surface.blit(self.wall_image, (old_tail_x * Global.BLOCK_SIZE + Global.LEFT_PADDING,
+                                                       old_tail_y * Global.BLOCK_SIZE + Global.TOP_PADDING))
+                    )
 
         self.changing_direction = False  # unlock direction
         self.hungry.hungry_step_count += 1
@@ -180,10 +306,11 @@ class Snake:
     def increase_length(self, length: int) -> bool:
         if length < 0:
             return False
-        self.length += length
-        for _ in range(length):
-            self.x.append(self.x[-1])
-            self.y.append(self.y[-1])
+        self.body.extend_tail(length)
+        tail_x, tail_y = self.body.get_tail()
+        if length > 0 and Util.is_inside_border(tail_x, tail_y):
+            # register the stacked segments
+            self._grid.add_body(tail_x, tail_y, length)
         return True
 
     def increase_speed(self, speed: int) -> None:
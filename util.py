@@ -3,8 +3,8 @@ import json
 import os
 import sys
 import time
-from threading import Event, Thread
-from typing import Callable, NoReturn
+from collections import deque
+from typing import Callable, NoReturn, Sequence
 
 import cv2
 import pygame
@@ -35,85 +35,172 @@ class Action(enum.Enum):
     QUIT_GAME = 5
 
 
-class RepeatedTimer(Thread):
-    """ (Modified from threading.Timer.)
-    Call a function repeatedly after a specified number of seconds:
-            t = RepeatedTimer(30.0, f, args=None, kwargs=None)
-            t.start()  t.stop()  # start and stop
-            t.pause()  t.resume()  # pause and resume
+class Timer:
+    """
+    Fixed-timestep scheduler driven by the main loop, without any thread.
+    Time measured by the monotonic clock is accumulated while the timer is running, and each `interval` of it
+    is one tick, consumed by the caller:
+            t = Timer(0.1)
+            t.start()  t.pause()  t.resume()  t.stop()  # start from zero, pause, resume and stop
+            while t.consume(): step()  # after t.update(), run all ticks elapsed since the last frame
+            if t.arrived: step()  # or at most one tick per frame
     """
 
-    def __init__(self, interval: float, function: Callable, args=None, kwargs=None) -> None:
-        Thread.__init__(self)
-        self.daemon = True
-        self.interval = interval
-        self.function = function
-        self.args: list = args if args is not None else []
-        self.kwargs: dict = kwargs if kwargs is not None else {}
-        self.finished = Event()
-        self.running = Event()
-        self.running.set()
-
-    def stop(self) -> None:
-        """ terminate timer's thread and stop the timer """
-        self.resume()
-        self.finished.set()
-
-    def pause(self) -> None:
-        self.running.clear()
-
-    def resume(self) -> None:
-        self.running.set()
-
-    def run(self) -> None:
-        while not self.finished.wait(self.interval):
-            self.function(*self.args, **self.kwargs)
-            self.running.wait()
-
-
-class Timer:
-    def __init__(self, interval: float = -1) -> None:
-        self._timer = RepeatedTimer(interval, self._set_status)
+    def __init__(self, interval: float = -1, max_lag: float = 0.25) -> None:
+        """
+        :param interval: seconds of one tick
+        :param max_lag: accumulated time is capped to this many seconds, so a long stall does not cause a burst
+        """
+        self.interval: float = interval
+        self.max_lag: float = max_lag
         self.started: bool = False
         self.paused: bool = False
-        self._arrived: bool = False
+        self._accumulator: float = 0
+        self._last_time: float = 0
 
     def set_interval_sec(self, interval: float) -> None:
         if interval <= 0:
             raise ValueError(f"the interval of Timer must be > 0, current: {interval}")
-        self._timer.interval = interval
-
-    def _set_status(self) -> None:
-        self._arrived = True
-        # print("Timer arrived")
+        self.interval = interval
 
     def start(self) -> None:
-        if self.paused:
-            self._timer.resume()
-            self.paused = False
-            return
-        if self._timer.interval <= 0:
-            raise ValueError(f"the interval of Timer must be > 0, current: {self._timer.interval}")
+        """ start from zero, ticks left from before are dropped even if the timer is paused """
+        if self.interval <= 0:
+            raise ValueError(f"the interval of Timer must be > 0, current: {self.interval}")
         self.started = True
-        self._timer.start()
+        self.paused = False
+        self._accumulator = 0
+        self._last_time = time.perf_counter()
 
     def pause(self) -> None:
-        if self.started:
-            self._timer.pause()
+        if self.started and not self.paused:
+            self.update()
             self.paused = True
 
+    def resume(self) -> None:
+        """ continue a paused timer with the ticks it had not consumed """
+        if self.started and self.paused:
+            self._last_time = time.perf_counter()
+            self.paused = False
+
     def stop(self) -> None:
-        if self.started:
-            self._timer.stop()
-            self.started = False
-        self._arrived = False
+        self.started = False
+        self.paused = False
+        self._accumulator = 0
+
+    def update(self) -> None:
+        """ accumulate the time passed since the last update, call once per frame """
+        if not self.started or self.paused:
+            return
+        now = time.perf_counter()
+        self._accumulator = min(self._accumulator + now - self._last_time, max(self.max_lag, self.interval))
+        self._last_time = now
+
+    def elapsed_ticks(self) -> int:
+        """ update and get the number of ticks not consumed yet """
+        self.update()
+        if not self.started:
+            return 0
+        return int(self._accumulator // self.interval)
+
+    def consume(self) -> bool:
+        """ consume one elapsed tick (without updating), return False if there is none """
+        if not self.started or self._accumulator < self.interval:
+            return False
+        self._accumulator -= self.interval
+        return True
 
     @property
     def arrived(self) -> bool:
-        if self._arrived:
-            self._arrived = False
-            return True
-        return False
+        """ update and consume one tick, the rest of elapsed ticks are kept for the following frames """
+        self.update()
+        return self.consume()
+
+
+class SpeedMeter:
+    """
+    Rolling-window rate of steps per second, updated in O(1) amortized per call:
+            m = SpeedMeter(1.0)
+            m.add(steps)  # once per frame, with the steps done in the frame
+            m.speed  # steps per second over about the last `window` seconds
+    """
+
+    def __init__(self, window: float = 1.0) -> None:
+        """
+        :param window: seconds of history used to calculate the speed
+        """
+        self.window: float = window
+        self._total: int = 0
+        # (monotonic time, total steps till then), the first sample is the last one older than the window
+        self._samples: deque[tuple[float, int]] = deque()
+
+    def clear(self) -> None:
+        self._total = 0
+        self._samples.clear()
+
+    def add(self, steps: int = 1) -> None:
+        now = time.perf_counter()
+        self._total += steps
+        samples = self._samples
+        if samples and samples[-1][0] == now:
+            samples[-1] = (now, self._total)
+        else:
+            samples.append((now, self._total))
+        while len(samples) > 2 and samples[1][0] <= now - self.window:
+            samples.popleft()
+
+    @property
+    def speed(self) -> float:
+        if len(self._samples) < 2:
+            return 0
+        (first_time, first_total), (last_time, last_total) = self._samples[0], self._samples[-1]
+        if last_time <= first_time:
+            return 0
+        return (last_total - first_total) / (last_time - first_time)
+
+
+class BlurLadder:
+    """
+    A snapshot blurred with a ladder of kernel sizes, for menu transitions.
+    Each step is blurred once at reduced resolution when first requested and cached, so entering and leaving
+    a menu reuse the same frames; only the upscale to full size is done on every call of `get`.
+    """
+
+    def __init__(self, surface: pygame.Surface, kernel_sizes: Sequence[int], scale: int = 4) -> None:
+        """
+        :param surface: the snapshot to blur, copied
+        :param kernel_sizes: gaussian kernel size (odd, at full resolution) of each step
+        :param scale: the snapshot is downscaled by this factor before blurring
+        """
+        self._source: pygame.Surface = surface.copy()
+        self._size: tuple[int, int] = surface.get_size()
+        small_size = (max(1, self._size[0] // scale), max(1, self._size[1] // scale))
+        self._small: pygame.Surface = pygame.transform.smoothscale(self._source, small_size)
+        self._scale: int = scale
+        self._kernel_sizes: tuple[int, ...] = tuple(kernel_sizes)
+        self._frames: list[pygame.Surface | None] = [None] * len(self._kernel_sizes)
+        self._output: pygame.Surface = pygame.Surface(self._size, 0, self._source)
+
+    def __len__(self) -> int:
+        return len(self._kernel_sizes)
+
+    def get(self, index: int) -> pygame.Surface:
+        """ get the full size surface of step `index`, the returned surface is reused by the next call """
+        kernel_size = self._kernel_sizes[index]
+        if kernel_size <= 1:
+            return self._source
+
+        frame = self._frames[index]
+        if frame is None:
+            # kernel size at reduced resolution, must be odd
+            small_kernel_size = max(1, kernel_size // self._scale) | 1
+            pixels = pygame.surfarray.pixels3d(self._small)  # zero-copy view, locks the surface
+            blurred = cv2.GaussianBlur(pixels, (small_kernel_size, small_kernel_size), 0)
+            del pixels
+            frame = pygame.Surface(self._small.get_size(), 0, self._small)
+            pygame.surfarray.blit_array(frame, blurred)
+            self._frames[index] = frame
+        return pygame.transform.smoothscale(frame, self._size, self._output)
 
 
 class Util:
@@ -121,12 +208,18 @@ class Util:
     user_event_count: int = 0
     user_timer_list: list[int] = []
 
-    # timers using builtin threading.Timer
+    # fixed-timestep timers driven by the main loop, made by Util.timer()
     timer_list: list[Timer] = []
 
+    # rects of the screen changed since the last update, used by update_screen(dirty_only=True)
+    dirty_rects: list[pygame.Rect] = []
+    full_update_requested: bool = True
+    # past this many rects, e.g. when drawing without presenting, the whole screen is updated instead
+    MAX_DIRTY_RECTS: int = 256
+
     @classmethod
     def timer(cls, interval: float = 0) -> Timer:
-        """ generate timer using builtin threading """
+        """ generate timer driven by the main loop """
         _timer = Timer(interval)
         cls.timer_list.append(_timer)
         return _timer
@@ -140,6 +233,19 @@ class Util:
             cls.user_timer_list.append(new_id)
         return new_id
 
+    @staticmethod
+    def load_image(file_name: str, size: tuple[int, int], alpha=False) -> pygame.Surface:
+        """
+        Load an image and scale it to `size`, the display must be initialized before calling.
+        :param file_name: image file name
+        :param size: (width, height) after scaling
+        :param alpha: keep per-pixel alpha of the image
+        :return: produced surface
+        """
+        image = pygame.image.load(file_name)
+        image = image.convert_alpha() if alpha else image.convert()
+        return pygame.transform.scale(image, size)
+
     @staticmethod
     def scale_blur(surface: pygame.Surface, value: float) -> pygame.Surface:
         """
@@ -171,12 +277,35 @@ class Util:
         surface = pygame.surfarray.make_surface(array)
         return surface
 
-    @staticmethod
-    def update_screen() -> None:
+    @classmethod
+    def add_dirty_rect(cls, rect: pygame.Rect) -> None:
+        """ mark a rect of the screen as changed, nothing is kept while a full update is requested """
+        if cls.full_update_requested:
+            return
+        if len(cls.dirty_rects) >= cls.MAX_DIRTY_RECTS:
+            cls.request_full_update()
+            cls.dirty_rects.clear()
+            return
+        cls.dirty_rects.append(rect)
+
+    @classmethod
+    def request_full_update(cls) -> None:
+        """ update the whole screen next time, e.g. after the window is resized or the surface is redrawn """
+        cls.full_update_requested = True
+
+    @classmethod
+    def update_screen(cls, dirty_only=False) -> None:
         """
         Actually draw surface to screen.
+        :param dirty_only: only push the rects marked by add_dirty_rect, unless a full update is requested
         """
-        pygame.display.flip()
+        if dirty_only and not cls.full_update_requested:
+            pygame.display.update(cls.dirty_rects)
+        else:
+            pygame.display.flip()
+            # keep pushing only dirty rects in the following frames
+            cls.full_update_requested = not dirty_only
+        cls.dirty_rects.clear()
 
     @staticmethod
     def is_inside_border(x: int, y: int) -> bool:
@@ -0,0 +1,307 @@
+import numpy as np
+import numpy.typing as npt
+
+from food import FOOD_TABLE, FoodKind
+from grid import Grid
+from settings import Global
+from util import GameState
+
+
+class VecSnakeEnv:
+    """
+    Batch of headless snake games stepped together with numpy array operations.
+
+    Boards use the same encoding as Grid.contents, stacked to (num_envs, GRID_ROW, GRID_COL).
+    Each snake body is a ring buffer of coordinates: the head moves backward in the ring, so a step writes
+    one element and drops the tail by keeping the length unchanged.
+    Finished games are reset automatically at the end of `step`.
+    """
+
+    # direction value -> (dx, dy), same order as snake.Direction
+    _DX = np.array((0, 1, 0, -1, 0), dtype=np.int16)
+    _DY = np.array((-1, 0, 1, 0, 0), dtype=np.int16)
+
+    def __init__(self, num_envs: int, seed: int | None = None) -> None:
+        self.num_envs: int = num_envs
+        self.width: int = Global.GRID_COL
+        self.height: int = Global.GRID_ROW
+        self.rng = np.random.default_rng(seed)
+
+        self.body_value: int = Grid.BODY
+        self.wall_value: int = Grid.WALL
+
+        # food kinds, same as FoodManager
+        self.food_kinds: tuple[FoodKind, ...] = FOOD_TABLE[:1] if Global.WITH_AI else FOOD_TABLE
+        food_list = self.food_kinds
+        self.food_names: tuple[str, ...] = tuple(food.name for food in food_list)
+        self.food_values = np.array([Grid.FOOD_MIN + i for i in range(len(food_list))], dtype=np.uint8)
+        # lookup tables indexed by grid value, filled only for food values
+        self._food_kind = np.full(256, -1, dtype=np.int16)
+        self._add_satiety = np.zeros(256, dtype=np.int16)
+        self._toxic_level = np.zeros(256, dtype=np.int16)
+        self._add_score = np.zeros(256, dtype=np.int32)
+        self._increase_length = np.zeros(256, dtype=np.int32)
+        for kind, food in enumerate(food_list):
+            value = self.food_values[kind]
+            self._food_kind[value] = kind
+            self._add_satiety[value] = food.add_satiety
+            self._toxic_level[value] = food.toxic_level
+            self._add_score[value] = food.add_score
+            self._increase_length[value] = food.increase_length
+
+        n, h, w = num_envs, self.height, self.width
+        self._env_ids = np.arange(n)
+        self.boards: npt.NDArray[np.uint8] = np.zeros((n, h, w), dtype=np.uint8)
+        # count of body segments on each cell, the body may overlap itself after eating its body
+        self.body_count: npt.NDArray[np.uint16] = np.zeros((n, h, w), dtype=np.uint16)
+        self.empty_count: npt.NDArray[np.int32] = np.zeros(n, dtype=np.int32)
+
+        # ring buffer of body coordinates, index 0 of a snake is at `head_index`
+        self.capacity: int = h * w + max(Global.INIT_LENGTH, 16)
+        self.body_x: npt.NDArray[np.int16] = np.zeros((n, self.capacity), dtype=np.int16)
+        self.body_y: npt.NDArray[np.int16] = np.zeros((n, self.capacity), dtype=np.int16)
+        self.head_index: npt.NDArray[np.int64] = np.zeros(n, dtype=np.int64)
+        self.length: npt.NDArray[np.int64] = np.zeros(n, dtype=np.int64)
+        self.direction: npt.NDArray[np.int8] = np.zeros(n, dtype=np.int8)
+
+        self.health: npt.NDArray[np.int16] = np.zeros(n, dtype=np.int16)
+        self.hungry_value: npt.NDArray[np.int16] = np.zeros(n, dtype=np.int16)
+        self.hungry_step_count: npt.NDArray[np.int64] = np.zeros(n, dtype=np.int64)
+        self.level: npt.NDArray[np.int16] = np.zeros(n, dtype=np.int16)
+        self.score: npt.NDArray[np.int64] = np.zeros(n, dtype=np.int64)
+        self.move_distance: npt.NDArray[np.int64] = np.zeros(n, dtype=np.int64)
+        self.eat_food_count: npt.NDArray[np.int64] = np.zeros(n, dtype=np.int64)
+
+        # food positions of each kind in spawning order, -1 if unused
+        max_food = max(food.max_count or Global.FOOD_MAX_COUNT_PER_KIND for food in food_list)
+        self.food_count: npt.NDArray[np.int16] = np.zeros((n, len(food_list)), dtype=np.int16)
+        self.food_x: npt.NDArray[np.int16] = np.full((n, len(food_list), max_food), -1, dtype=np.int16)
+        self.food_y: npt.NDArray[np.int16] = np.full((n, len(food_list), max_food), -1, dtype=np.int16)
+
+        # final score of the games finished in the last step
+        self.final_score: npt.NDArray[np.int64] = np.zeros(n, dtype=np.int64)
+
+        self.reset()
+
+    @property
+    def head_x(self) -> npt.NDArray[np.int16]:
+        return self.body_x[self._env_ids, self.head_index]
+
+    @property
+    def head_y(self) -> npt.NDArray[np.int16]:
+        return self.body_y[self._env_ids, self.head_index]
+
+    def get_score(self) -> npt.NDArray[np.int64]:
+        return self.length - Global.INIT_LENGTH + self.score
+
+    def reset(self, env_ids: npt.ArrayLike | None = None) -> None:
+        """ reset the given games, all games if env_ids is None """
+        ids = self._env_ids if env_ids is None else np.asarray(env_ids).reshape(-1)
+        for i in ids:
+            self._reset_one(int(i))
+
+    def _reset_one(self, i: int) -> None:
+        board = self.boards[i]
+        board.fill(0)
+        self.body_count[i].fill(0)
+        self.empty_count[i] = self.width * self.height
+
+        length = Global.INIT_LENGTH
+        xs = Global.INIT_POS[0] + np.arange(length - 1, -1, -1)
+        self.head_index[i] = 0
+        self.length[i] = length
+        self.body_x[i, :length] = xs
+        self.body_y[i, :length] = Global.INIT_POS[1]
+        self.body_count[i, Global.INIT_POS[1], xs] = 1
+        board[Global.INIT_POS[1], xs] = self.body_value
+        self.empty_count[i] -= length
+        self.direction[i] = 1  # Direction.RIGHT
+
+        self.health[i] = Global.INIT_HEALTH
+        self.hungry_value[i] = 0
+        self.hungry_step_count[i] = 0
+        self.level[i] = 1
+        self.score[i] = 0
+        self.move_distance[i] = 0
+        self.eat_food_count[i] = 0
+
+        # walls, same count as Wall.random_gen
+        wall_count = int(Global.WALL_COUNT_IN_THOUSANDTHS / 1000 * self.width * self.height)
+        if wall_count > 0:
+            candidates = np.flatnonzero(board.ravel() == 0)
+            cells = self.rng.choice(candidates, size=min(wall_count, candidates.size), replace=False)
+            board.ravel()[cells] = self.wall_value
+            self.empty_count[i] -= cells.size
+
+        self.food_count[i] = 0
+        self.food_x[i] = -1
+        self.food_y[i] = -1
+        for kind in range(len(self.food_names)):
+            self._spawn_food(i, kind)
+
+    def _spawn_food(self, i: int, kind: int) -> None:
+        """ add food of `kind` at random empty cells, same rule as FoodManager.spawn """
+        food = self.food_kinds[kind]
+        max_count = food.max_count or Global.FOOD_MAX_COUNT_PER_KIND
+        board = self.boards[i]
+        while self.empty_count[i] > 0:
+            y, x = self._random_empty_cell(i)
+            board[y, x] = self.food_values[kind]
+            self.empty_count[i] -= 1
+            count = self.food_count[i, kind]
+            self.food_x[i, kind, count] = x
+            self.food_y[i, kind, count] = y
+            self.food_count[i, kind] += 1
+
+            # add food at random until count >= max_count
+            if self.food_count[i, kind] < max_count and self.rng.random() < food.spawn_weight:
+                continue
+            break
+
+    def _random_empty_cell(self, i: int) -> tuple[int, int]:
+        """ pick a random empty cell of game `i`, rejection sampling first and scan the board if it keeps failing """
+        board = self.boards[i]
+        for _ in range(8):
+            cell = int(self.rng.integers(board.size))
+            if board.flat[cell] == 0:
+                return divmod(cell, self.width)
+        cell = int(self.rng.choice(np.flatnonzero(board.ravel() == 0)))
+        return divmod(cell, self.width)
+
+    def _remove_food(self, i: int, kind: int, x: int, y: int) -> None:
+        count = int(self.food_count[i, kind])
+        for index in range(count):
+            if self.food_x[i, kind, index] == x and self.food_y[i, kind, index] == y:
+                self.food_x[i, kind, index:count - 1] = self.food_x[i, kind, index + 1:count]
+                self.food_y[i, kind, index:count - 1] = self.food_y[i, kind, index + 1:count]
+                self.food_x[i, kind, count - 1] = -1
+                self.food_y[i, kind, count - 1] = -1
+                break
+        self.food_count[i, kind] -= 1
+
+    def _grow(self, i: int, length: int) -> None:
+        """ append copies of the tail, same as Snake.increase_length """
+        length = min(length, self.capacity - 1 - int(self.length[i]))
+        if length <= 0:
+            return
+        tail = (self.head_index[i] + self.length[i] - 1) % self.capacity
+        tail_x, tail_y = self.body_x[i, tail], self.body_y[i, tail]
+        new = (tail + 1 + np.arange(length)) % self.capacity
+        self.body_x[i, new] = tail_x
+        self.body_y[i, new] = tail_y
+        self.length[i] += length
+        if 0 <= tail_x < self.width and 0 <= tail_y < self.height:
+            self.body_count[i, tail_y, tail_x] += length
+
+    def step(self, directions: npt.ArrayLike, teleport=False) -> \
+            tuple[npt.NDArray[np.bool_], npt.NDArray[np.int8], npt.NDArray[np.bool_],
+                  npt.NDArray[np.bool_], npt.NDArray[np.bool_]]:
+        """
+        move all snakes one step, finished games are reset afterwards
+
+        :param directions: (num_envs,) Direction values, Direction.NONE.value or a 180-degree turn keeps direction
+        :param teleport: set if snake can teleport when hit the border
+        :return: (alive, game_state, collision_with_food, collision_with_body, collision_with_wall), each of shape
+                 (num_envs,), game_state holds GameState values
+        """
+        ids = self._env_ids
+        cap = self.capacity
+        directions = np.asarray(directions, dtype=np.int8)
+
+        # change direction, prevent 180-degree turns
+        turn = (directions < 4) & ((directions + 2) % 4 != self.direction)
+        self.direction = np.where(turn, directions, self.direction)
+
+        # save tail
+        tail_index = (self.head_index + self.length - 1) % cap
+        tail_x = self.body_x[ids, tail_index]
+        tail_y = self.body_y[ids, tail_index]
+
+        # move head, the old tail is dropped from the ring by keeping the length
+        head_x = self.body_x[ids, self.head_index] + self._DX[self.direction]
+        head_y = self.body_y[ids, self.head_index] + self._DY[self.direction]
+        if teleport:
+            head_x %= self.width
+            head_y %= self.height
+        self.head_index = (self.head_index - 1) % cap
+        self.body_x[ids, self.head_index] = head_x
+        self.body_y[ids, self.head_index] = head_y
+        self.move_distance += 1
+        self.hungry_step_count += 1
+
+        # register head to the board
+        head_inside = (head_x >= 0) & (head_x < self.width) & (head_y >= 0) & (head_y < self.height)
+        h_ids, h_x, h_y = ids[head_inside], head_x[head_inside], head_y[head_inside]
+        head_value = self.boards[h_ids, h_y, h_x]
+        new_body = self.body_count[h_ids, h_y, h_x] == 0
+        self.empty_count[h_ids[head_value == 0]] -= 1
+        self.boards[h_ids[new_body], h_y[new_body], h_x[new_body]] += self.body_value
+        self.body_count[h_ids, h_y, h_x] += 1
+
+        # unregister old tail if no other segment is left on it
+        tail_inside = (tail_x >= 0) & (tail_x < self.width) & (tail_y >= 0) & (tail_y < self.height)
+        t_ids, t_x, t_y = ids[tail_inside], tail_x[tail_inside], tail_y[tail_inside]
+        self.body_count[t_ids, t_y, t_x] -= 1
+        cleared = self.body_count[t_ids, t_y, t_x] == 0
+        c_ids, c_x, c_y = t_ids[cleared], t_x[cleared], t_y[cleared]
+        self.boards[c_ids, c_y, c_x] -= self.body_value
+        self.empty_count[c_ids[self.boards[c_ids, c_y, c_x] == 0]] += 1
+
+        # collision with food
+        value = np.full(self.num_envs, self.wall_value, dtype=np.int16)  # outside the border acts as wall
+        value[head_inside] = self.boards[h_ids, h_y, h_x]
+        has_body = (value == Grid.BODY) | ((value >= 110) & (value < 200)) | (value == Grid.BODY_ON_WALL)
+        under_body = np.where(has_body, value - self.body_value, value)
+        food_value = np.where(head_inside & (self._food_kind[under_body] >= 0), under_body, 0)
+        collide_with_food = food_value > 0
+        if collide_with_food.any():
+            self.boards[ids[collide_with_food], head_y[collide_with_food], head_x[collide_with_food]] -= \
+                food_value[collide_with_food].astype(np.uint8)
+            add_satiety = self._add_satiety[food_value]
+            self.hungry_value = np.clip(self.hungry_value - add_satiety, 0, Global.MAX_SATIETY).astype(np.int16)
+            self.hungry_step_count[collide_with_food & (add_satiety > 0)] = 0
+            self.health = np.clip(self.health - self._toxic_level[food_value], 0, Global.MAX_HEALTH).astype(np.int16)
+            self.score += self._add_score[food_value]
+            self.eat_food_count += collide_with_food
+            for i in np.flatnonzero(collide_with_food):
+                kind = int(self._food_kind[food_value[i]])
+                self._remove_food(i, kind, int(head_x[i]), int(head_y[i]))
+                self._spawn_food(i, kind)
+                self._grow(i, int(self._increase_length[food_value[i]]))
+
+            # check upgrade after eating food
+            upgrade = collide_with_food & (self.level < Global.MAX_LEVEL) & \
+                (self.get_score() // 20 > self.level - 1)
+            self.level += upgrade
+
+        # collision with body: the head shares its cell with another segment
+        collide_with_body = np.zeros(self.num_envs, dtype=np.bool_)
+        collide_with_body[head_inside] = self.body_count[h_ids, h_y, h_x] > 1
+        self.health[collide_with_body] -= Global.EAT_BODY_DAMAGE
+
+        # collision with wall
+        collide_with_wall = under_body == self.wall_value
+        self.health[collide_with_wall] -= Global.HIT_WALL_DAMAGE
+        np.maximum(self.health, 0, out=self.health)
+
+        # update hungry level
+        hungry_interval = np.maximum(50 - (self.level - 1) * 4, 20)
+        hungry = (self.hungry_step_count > 0) & (self.hungry_step_count % hungry_interval == 0)
+        starving = hungry & (self.hungry_value >= Global.INIT_SATIETY)
+        self.hungry_value[hungry & ~starving] = np.minimum(self.hungry_value[hungry & ~starving] + 1,
+                                                           Global.MAX_SATIETY)
+        self.health[starving] = np.maximum(self.health[starving] - 1, 0)
+
+        # check alive
+        winning = self.empty_count <= 0
+        failed = self.health <= 0
+        alive = ~(winning | failed)
+        result = np.full(self.num_envs, GameState.PLAYING.value, dtype=np.int8)
+        result[failed] = GameState.FAILED.value
+        result[winning] = GameState.WINNING.value
+
+        done = np.flatnonzero(~alive)
+        if done.size:
+            self.final_score[done] = self.get_score()[done]
+            self.reset(done)
+        return alive, result, collide_with_food, collide_with_body, collide_with_wall
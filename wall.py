@@ -4,15 +4,20 @@ import pygame
 
 from grid import Grid
 from settings import Global
+from util import Util
 
 
 class Wall:
-    def __init__(self, grid: Grid) -> None:
+    def __init__(self, grid: Grid, headless=False, rng: random.Random | None = None) -> None:
+        """
+        :param grid: the grid to place walls on
+        :param headless: do not load any image, the wall can not be drawn in this case
+        :param rng: random stream of wall generation, a new unseeded one if None
+        """
         self._grid: Grid = grid
-        self.image = pygame.transform.scale(
-            pygame.image.load("resources/img/grey-e6e6e6-10x10.png").convert(),
-            (Global.BLOCK_SIZE, Global.BLOCK_SIZE)
-        )
+        self._rng: random.Random = rng if rng is not None else random.Random()
+        self.image: pygame.Surface | None = None if headless else \
+            Util.load_image("resources/img/grey-e6e6e6-10x10.png", (Global.BLOCK_SIZE, Global.BLOCK_SIZE))
         self.coords: set[tuple] = set()
         self.random_gen(Global.WALL_COUNT_IN_THOUSANDTHS)
 
@@ -24,18 +29,15 @@ class Wall:
         wall_block_count = int(value_in_thousandths / 1000 * Global.GRID_COL * Global.GRID_ROW)
 
         for _ in range(wall_block_count):
-            while True:
-                new_x = random.randint(0, Global.GRID_COL - 1)
-                new_y = random.randint(0, Global.GRID_ROW - 1)
-                if self._grid.has_body(new_x, new_y) or (new_x, new_y) in self.coords:
-                    continue
-                self.coords.add((new_x, new_y))
+            cell = self._grid.random_empty_cell(self._rng)
+            if cell is None:
                 break
-
-        for coord in self.coords:
-            self._grid.set_type(coord[0], coord[1], 'wall')
+            self.coords.add(cell)
+            self._grid.set_type(cell[0], cell[1], 'wall')
 
     def draw(self, surface: pygame.Surface) -> None:
+        if self.image is None:
+            raise TypeError("Wall image is None.")
         for coord in self.coords:
             surface.blit(
                 self.image,